@@ -0,0 +1,323 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from collaborative_filtering import RatingMatrix
+
+# Ratings held by the movie rows of a chunk of pairs, bounding the memory of the sparse row
+# products however often a popular movie appears in the pairs
+PAIR_CHUNK_RATINGS = 10_000_000
+
+
+def _pair_chunks(ratings: sparse.csr_matrix, left: np.ndarray, right: np.ndarray) -> list[slice]:
+    """Slices of the pairs whose rows hold about PAIR_CHUNK_RATINGS ratings between them, a pair
+    holding more on its own"""
+    lengths = np.diff(ratings.indptr).astype(np.int64)
+    touched = np.cumsum(lengths[left] + lengths[right])
+    chunks, start = [], 0
+    while start < len(left):
+        before = touched[start - 1] if start else 0
+        stop = max(np.searchsorted(touched, before + PAIR_CHUNK_RATINGS, side="right").item(), start + 1)
+        chunks.append(slice(start, stop))
+        start = stop
+    return chunks
+
+
+def _pattern(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    pattern = matrix.copy()
+    pattern.data[:] = 1.0
+    return pattern
+
+
+def _values_at(matrix: sparse.csr_matrix, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """Stored values of a matrix with sorted indices at entries known to be stored"""
+    keys = np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr)) * matrix.shape[1] + matrix.indices
+    return matrix.data[np.searchsorted(keys, rows * matrix.shape[1] + columns)]
+
+
+def _pair_sums(ratings: sparse.csr_matrix, left: np.ndarray, right: np.ndarray):
+    """Sums over the users who rated both movies of each pair: count, x, y, x², y² and xy"""
+    r_left, r_right = ratings[left], ratings[right]
+    # The users who rated both, then the two ratings each of them gave
+    both = _pattern(r_left).multiply(_pattern(r_right)).tocsr()
+    both.sort_indices()
+    rows = np.repeat(np.arange(len(left), dtype=np.int64), np.diff(both.indptr))
+    x, y = _values_at(r_left, rows, both.indices), _values_at(r_right, rows, both.indices)
+
+    def row_sums(values):
+        return np.bincount(rows, weights=values, minlength=len(left))
+
+    return np.diff(both.indptr), row_sums(x), row_sums(y), row_sums(x * x), row_sums(y * y), row_sums(x * y)
+
+
+def _pearson_from_sums(n, sx, sy, sxx, syy, sxy) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = sxy - sx * sy / n
+        variance = (sxx - sx * sx / n) * (syy - sy * sy / n)
+        correlation = covariance / np.sqrt(variance)
+    correlation[(n < 2) | ~(variance > 1e-12)] = np.nan
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def pair_correlations(ratings: sparse.csr_matrix, left: np.ndarray, right: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pearson correlation and overlap of the movie rows in each pair, over the users who rated
+    both movies, as corrwith gives on the pivoted ratings"""
+    ratings = ratings if ratings.has_sorted_indices else ratings.sorted_indices()
+    correlations, overlaps = [], []
+    for chunk in _pair_chunks(ratings, left, right):
+        sums = _pair_sums(ratings, left[chunk], right[chunk])
+        correlations.append(_pearson_from_sums(*sums))
+        overlaps.append(sums[0].astype(np.int64))
+    if not correlations:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    return np.concatenate(correlations), np.concatenate(overlaps)
+
+
+def exact_correlations(ratings: sparse.csr_matrix, min_overlap: int = 2) -> pd.DataFrame:
+    """Correlation of every pair of movie rows rated by at least min_overlap of the same users.
+    Quadratic in movies, this is the exact engine the candidates are measured against"""
+    rated = _pattern(ratings)
+    overlap = sparse.triu(rated @ rated.T, k=1).tocoo()
+    keep = overlap.data >= max(min_overlap, 1)
+    left, right = overlap.row[keep], overlap.col[keep]
+    correlation, overlap = pair_correlations(ratings, left, right)
+    return pd.DataFrame({"left": left, "right": right, "correlation": correlation, "overlap": overlap})
+
+
+class MinHashLSH:
+    """Candidate pairs of similar movies from MinHash signatures of the set of users who rated
+    each movie, bucketed with locality sensitive hashing, so the exact correlation is only worked
+    out for the pairs likely to matter rather than for every pair in the catalogue.
+
+    A pair whose rater sets have a Jaccard similarity s becomes a candidate with probability
+    1 - (1 - s^rows)^bands, where rows = num_perm / bands. More bands raise recall and cost,
+    more rows per band lower both; the similarity where the curve turns is about threshold"""
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, seed: int = 0, perm_chunk: int = 16) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm {num_perm} is not a multiple of bands {bands}")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.seed = seed
+        self.perm_chunk = perm_chunk
+        rng = np.random.default_rng(seed)
+        # Multiply shift hashing of 32 bit ids, the top 32 bits of a * x + b (mod 2^64) with a odd
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.matrix = None
+        self.signatures = None
+
+    @property
+    def threshold(self) -> float:
+        """Jaccard similarity at which a pair is about as likely to be a candidate as not"""
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def fit(self, df_reviews: pd.DataFrame, genres: pd.Series = None) -> "MinHashLSH":
+        """Signatures of each movie's raters and, when a Series of genre lists by movieId is
+        given, of its genres too, so movies of the same genres also become candidates"""
+        self.matrix = RatingMatrix(df_reviews)
+        self.ratings = self.matrix.ratings.T.tocsr()
+        members = _pattern(self.ratings)
+        if genres is not None:
+            genre_lists = genres.reindex(self.matrix.movie_ids)
+            exploded = genre_lists.explode().dropna()
+            rows = pd.Index(self.matrix.movie_ids).get_indexer(exploded.index)
+            genre_codes, _ = pd.factorize(exploded)
+            genre_matrix = sparse.csr_matrix(
+                (np.ones(len(rows)), (rows, genre_codes)), shape=(members.shape[0], genre_codes.max(initial=-1) + 1)
+            )
+            members = sparse.hstack([members, genre_matrix]).tocsr()
+        self.signatures = self._signatures(members)
+        return self
+
+    def _signatures(self, members: sparse.csr_matrix) -> np.ndarray:
+        members.sort_indices()
+        ids = np.arange(members.shape[1], dtype=np.uint64)
+        starts = members.indptr[:-1]
+        signatures = np.empty((members.shape[0], self.num_perm), dtype=np.uint32)
+        for first in range(0, self.num_perm, self.perm_chunk):
+            last = min(first + self.perm_chunk, self.num_perm)
+            # Hash each user once, then look the hashes up for every rating
+            hashes = ((ids[:, None] * self._a[first:last] + self._b[first:last]) >> np.uint64(32)).astype(np.uint32)
+            signatures[:, first:last] = np.minimum.reduceat(hashes[members.indices], starts, axis=0)
+        return signatures
+
+    def candidate_pairs(self) -> np.ndarray:
+        """Row pairs (left < right) that share a bucket in at least one band"""
+        movies = self.signatures.shape[0]
+        keys = []
+        for band in range(self.bands):
+            # Bucket by a 64 bit hash of the band, a rare collision only adds a candidate
+            buckets = np.zeros(movies, dtype=np.uint64)
+            for row in self.signatures[:, band * self.rows : (band + 1) * self.rows].T:
+                buckets = buckets * np.uint64(0x9E3779B97F4A7C15) + row
+            order = np.argsort(buckets, kind="stable")
+            sorted_buckets = buckets[order]
+            # Pair each movie with the ones after it in the same bucket
+            for offset in range(1, movies):
+                same = sorted_buckets[offset:] == sorted_buckets[:-offset]
+                if not same.any():
+                    break
+                left, right = order[:-offset][same], order[offset:][same]
+                keys.append(np.minimum(left, right).astype(np.int64) * movies + np.maximum(left, right))
+        if not keys:
+            return np.empty((0, 2), dtype=np.int64)
+        keys = np.unique(np.concatenate(keys))
+        return np.column_stack([keys // movies, keys % movies])
+
+    def similar_pairs(self, min_overlap: int = 2) -> pd.DataFrame:
+        """Exact correlation of the candidate pairs rated by at least min_overlap of the same users"""
+        pairs = self.candidate_pairs()
+        correlation, overlap = pair_correlations(self.ratings, pairs[:, 0], pairs[:, 1])
+        keep = overlap >= min_overlap
+        movie_ids = np.asarray(self.matrix.movie_ids)
+        return pd.DataFrame(
+            {
+                "movieId": movie_ids[pairs[keep, 0]],
+                "similar_movieId": movie_ids[pairs[keep, 1]],
+                "correlation": correlation[keep],
+                "overlap": overlap[keep],
+            }
+        )
+
+    def recall(self, exact: pd.DataFrame, min_correlation: float = 0.5, min_overlap: int = 2) -> float:
+        """Share of the pairs the exact engine finds correlated that are among the candidates"""
+        relevant = exact[(exact["correlation"] >= min_correlation) & (exact["overlap"] >= min_overlap)]
+        if relevant.empty:
+            return 1.0
+        movies = self.signatures.shape[0]
+        pairs = self.candidate_pairs()
+        found = np.isin(
+            relevant["left"].to_numpy(np.int64) * movies + relevant["right"].to_numpy(np.int64),
+            pairs[:, 0] * movies + pairs[:, 1],
+        )
+        return found.mean().item()
+
+
+if __name__ == "__main__":
+    import time
+    import warnings
+
+    # Communities of users who rate the same movies, the same way, plus random noise ratings
+    rng = np.random.default_rng(10)
+    communities, users_per_community, movies_per_community = 200, 25, 15
+    users = np.repeat(np.arange(communities * users_per_community), movies_per_community)
+    community = users // users_per_community
+    movies = community * movies_per_community + np.tile(np.arange(movies_per_community), communities * users_per_community)
+    taste = rng.normal(0, 1, communities * movies_per_community)
+    harshness = rng.normal(0, 1, communities * users_per_community)
+    keep = rng.random(len(users)) < 0.9
+    df_reviews = pd.DataFrame(
+        {
+            "userId": users[keep],
+            "movieId": movies[keep],
+            "rating": np.clip(np.round(3 + taste[movies[keep]] - harshness[users[keep]] + rng.normal(0, 0.3, keep.sum())), 1, 5),
+        }
+    )
+    noise = pd.DataFrame(
+        {
+            "userId": rng.integers(0, communities * users_per_community, 10_000),
+            "movieId": rng.integers(0, communities * movies_per_community, 10_000),
+            "rating": rng.integers(1, 6, 10_000).astype(float),
+        }
+    )
+    df_reviews = pd.concat([df_reviews, noise], ignore_index=True)
+
+    start = time.perf_counter()
+    lsh = MinHashLSH(num_perm=96, bands=32, seed=1).fit(df_reviews)
+    similar = lsh.similar_pairs()
+    lsh_time = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = exact_correlations(lsh.ratings)
+    exact_time = time.perf_counter() - start
+    recall = lsh.recall(exact, min_correlation=0.5, min_overlap=5)
+    print(
+        f"LSH {len(similar)} pairs in {lsh_time:.2f}s, exact {len(exact)} pairs in {exact_time:.2f}s, "
+        f"threshold {lsh.threshold:.2f}, recall {recall:.3f}"
+    )
+    assert recall > 0.95
+    all_pairs = lsh.signatures.shape[0] * (lsh.signatures.shape[0] - 1) // 2
+    assert len(lsh.candidate_pairs()) < all_pairs / 100
+
+    # Candidates are correlated exactly, so they agree with the exact engine
+    merged = similar.merge(
+        exact.assign(
+            movieId=lsh.matrix.movie_ids[exact["left"]], similar_movieId=lsh.matrix.movie_ids[exact["right"]]
+        ),
+        on=["movieId", "similar_movieId"],
+    )
+    assert len(merged) == len(similar)
+    assert np.allclose(merged["correlation_x"], merged["correlation_y"], equal_nan=True)
+
+    # The same seed gives the same signatures, another seed different ones
+    assert np.array_equal(MinHashLSH(96, 32, seed=1).fit(df_reviews).signatures, lsh.signatures)
+    assert not np.array_equal(MinHashLSH(96, 32, seed=2).fit(df_reviews).signatures, lsh.signatures)
+
+    # Fewer rows per band finds more of the weaker pairs, at more cost
+    assert len(MinHashLSH(96, 48, seed=1).fit(df_reviews).candidate_pairs()) > len(lsh.candidate_pairs())
+
+    # Correlation agrees with corrwith on the pivoted ratings
+    small = df_reviews[df_reviews["movieId"] < 30]
+    pivot = small.drop_duplicates(["userId", "movieId"], keep="last").pivot_table(index="userId", columns="movieId", values="rating")
+    small_lsh = MinHashLSH(64, 16).fit(small)
+    # Pairs with fewer than two shared users or no variance are NaN in both, without the warnings
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        expected = pivot.corrwith(pivot[0]).to_numpy()[1:]
+    found, _ = pair_correlations(small_lsh.ratings, np.zeros(29, dtype=np.int64), np.arange(1, 30))
+    assert np.allclose(found, expected, equal_nan=True)
+
+    genres = pd.Series({movie_id: ["Comedy"] if movie_id % 2 else ["Drama"] for movie_id in range(30)})
+    with_genres = MinHashLSH(64, 16).fit(small, genres=genres)
+    assert with_genres.signatures.shape == (30, 64)
+
+    # On a large catalogue, where heavy raters of popular movies make most pairs overlap, the
+    # candidates build an order of magnitude faster than correlating every overlapping pair
+    communities, users_per_community, movies_per_community, noise_size = 1000, 20, 10, 100_000
+    users = np.repeat(np.arange(communities * users_per_community), movies_per_community)
+    movies = (users // users_per_community) * movies_per_community + np.tile(
+        np.arange(movies_per_community), communities * users_per_community
+    )
+    taste = rng.normal(0, 1, communities * movies_per_community)
+    harshness = rng.normal(0, 1, communities * users_per_community)
+    keep = rng.random(len(users)) < 0.9
+    large = pd.DataFrame(
+        {
+            "userId": np.concatenate([users[keep], rng.integers(0, communities * users_per_community, noise_size)]),
+            "movieId": np.concatenate(
+                [movies[keep], (rng.zipf(1.4, noise_size) - 1) % (communities * movies_per_community)]
+            ),
+            "rating": np.concatenate(
+                [
+                    np.clip(np.round(3 + taste[movies[keep]] - harshness[users[keep]] + rng.normal(0, 0.3, keep.sum())), 1, 5),
+                    rng.integers(1, 6, noise_size).astype(float),
+                ]
+            ),
+        }
+    )
+    start = time.perf_counter()
+    large_lsh = MinHashLSH(num_perm=96, bands=32, seed=1).fit(large)
+    large_similar = large_lsh.similar_pairs()
+    lsh_time = time.perf_counter() - start
+    start = time.perf_counter()
+    large_exact = exact_correlations(large_lsh.ratings)
+    exact_time = time.perf_counter() - start
+    # Random ratings of popular movies correlate by chance over a few users, so recall is measured
+    # on the pairs with enough overlap to matter
+    recall = large_lsh.recall(large_exact, min_correlation=0.5, min_overlap=10)
+    print(
+        f"Large catalogue: LSH {len(large_similar)} pairs in {lsh_time:.2f}s, exact {len(large_exact)} pairs "
+        f"in {exact_time:.2f}s, {exact_time / lsh_time:.1f}x faster, recall {recall:.3f}"
+    )
+    assert recall > 0.95
+    # The speedup comes from correlating a small share of the overlapping pairs
+    assert len(large_lsh.candidate_pairs()) < len(large_exact) / 2
+    assert len(large_similar) <= len(large_lsh.candidate_pairs())
+
+    # Chunks hold a bounded number of ratings however often popular movies are paired
+    lengths = np.diff(large_lsh.ratings.indptr)
+    left, right = large_exact["left"].to_numpy(), large_exact["right"].to_numpy()
+    chunks = _pair_chunks(large_lsh.ratings, left, right)
+    touched = [(lengths[left[chunk]] + lengths[right[chunk]]).sum() for chunk in chunks]
+    assert all(ratings <= PAIR_CHUNK_RATINGS or chunk.stop - chunk.start == 1 for ratings, chunk in zip(touched, chunks))
+    assert chunks[-1].stop == len(left) and all(a.stop == b.start for a, b in zip(chunks, chunks[1:]))
@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+
+class RatingMatrix:
+    """Sparse users x movies matrix of ratings, with the userId and movieId of each row and column"""
+
+    def __init__(self, df_reviews: pd.DataFrame) -> None:
+        # Keep the latest rating where a user rated a movie more than once
+        df_reviews = df_reviews.drop_duplicates(["userId", "movieId"], keep="last")
+        user_codes, self.user_ids = pd.factorize(df_reviews["userId"], sort=True)
+        movie_codes, self.movie_ids = pd.factorize(df_reviews["movieId"], sort=True)
+        self.ratings = sparse.csr_matrix(
+            (df_reviews["rating"].to_numpy(dtype=np.float64), (user_codes, movie_codes)),
+            shape=(len(self.user_ids), len(self.movie_ids)),
+        )
+        self._user_rows = pd.Index(self.user_ids)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.ratings.shape
+
+    def user_row(self, user_id) -> int:
+        """Row of the user, raising a KeyError for a user without ratings"""
+        return self._user_rows.get_loc(user_id)
+
+
+class UserKNN:
+    """User based collaborative filtering: what the users who rate like me rated highly.
+    The top k neighbours of every user are found once, in blocks of users so only a block of the
+    similarity matrix is ever held, and kept as two compact users x k arrays. A block is dense over
+    all users, taking 16 bytes per user for each user in it, so it holds at most block_size users
+    and no more than fit in block_bytes. Scoring a user then only touches the ratings of their k
+    neighbours"""
+
+    def __init__(
+        self, k: int = 20, centred: bool = True, block_size: int = 1024, min_support: int = 1, block_bytes: int = 256 * 2**20
+    ) -> None:
+        """centred subtracts each user's mean rating first, which makes the cosine similarity
+        a Pearson correlation over the movies rated, so generous and harsh raters compare fairly.
+        min_support is how many neighbours must have rated a movie for it to be scored, so one
+        neighbour's rating of an obscure movie does not outrank what many neighbours agree on"""
+        self.k = k
+        self.centred = centred
+        self.min_support = min_support
+        self.block_size = block_size
+        self.block_bytes = block_bytes
+        self.matrix = None
+        self.neighbours = None
+        self.similarities = None
+
+    def fit(self, df_reviews: pd.DataFrame) -> "UserKNN":
+        self.matrix = RatingMatrix(df_reviews)
+        ratings = self.matrix.ratings
+        rated = ratings.copy()
+        rated.data[:] = 1.0
+        self._rated = rated
+        counts = np.diff(ratings.indptr)
+        self.user_means = np.divide(
+            np.asarray(ratings.sum(axis=1)).ravel(), counts, out=np.zeros(len(counts)), where=counts > 0
+        )
+        centred = ratings.copy()
+        if self.centred:
+            centred.data -= np.repeat(self.user_means, counts)
+        self._centred = centred
+
+        norms = np.sqrt(np.asarray(centred.multiply(centred).sum(axis=1)).ravel())
+        unit = sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)) @ centred
+        unit = unit.tocsr()
+        self._build_neighbours(unit)
+        return self
+
+    def _build_neighbours(self, unit: sparse.csr_matrix) -> None:
+        users = unit.shape[0]
+        k = min(self.k, users - 1)
+        self.neighbours = np.zeros((users, k), dtype=np.int32)
+        self.similarities = np.zeros((users, k), dtype=np.float32)
+        if k <= 0:
+            return
+        unit_t = unit.T.tocsc()
+        # The dense float64 block and the int64 positions argpartition returns for it
+        rows = max(1, min(self.block_size, self.block_bytes // (16 * users)))
+        for start in range(0, users, rows):
+            stop = min(start + rows, users)
+            # Negated in place so the smallest come first without another copy of the block
+            block = (unit[start:stop] @ unit_t).toarray()
+            np.negative(block, out=block)
+            # A user is not their own neighbour
+            block[np.arange(stop - start), np.arange(start, stop)] = np.inf
+            top = np.argpartition(block, k - 1, axis=1)[:, :k]
+            top_similarity = -np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_similarity, axis=1, kind="stable")
+            self.neighbours[start:stop] = np.take_along_axis(top, order, axis=1)
+            self.similarities[start:stop] = np.take_along_axis(top_similarity, order, axis=1)
+
+    def user_neighbours(self, user_id) -> pd.Series:
+        """Similarity of the user's neighbours by userId, most similar first"""
+        row = self.matrix.user_row(user_id)
+        return pd.Series(
+            self.similarities[row], index=self.matrix.user_ids[self.neighbours[row]], name="similarity"
+        )
+
+    def scores(self, user_id) -> np.ndarray:
+        """Predicted rating of every movie for the user, the user's mean plus the similarity weighted
+        mean of how far the neighbours rated each movie from their own mean. nan for movies fewer
+        than min_support positively similar neighbours have rated"""
+        row = self.matrix.user_row(user_id)
+        weights = self.similarities[row].astype(np.float64)
+        positive = weights > 0
+        neighbours, weights = self.neighbours[row][positive], weights[positive]
+        weighted = self._centred[neighbours].T @ weights
+        total_weight = self._rated[neighbours].T @ weights
+        support = self._rated[neighbours].T @ np.ones(len(neighbours))
+        offset = self.user_means[row] if self.centred else 0.0
+        return offset + np.divide(
+            weighted,
+            total_weight,
+            out=np.full(len(weighted), np.nan),
+            where=(total_weight > 0) & (support >= self.min_support),
+        )
+
+    def predict(self, user_id, movie_id) -> float:
+        """Predicted rating of the movie for the user, nan when none of the neighbours rated it"""
+        column = pd.Index(self.matrix.movie_ids).get_loc(movie_id)
+        return self.scores(user_id)[column].item()
+
+    def recommend(self, user_id, n: int = 10, exclude_rated: bool = True) -> pd.DataFrame:
+        """The n movies with the highest predicted rating for the user, best first"""
+        scores = self.scores(user_id)
+        if exclude_rated:
+            row = self.matrix.user_row(user_id)
+            scores[self._rated.indices[self._rated.indptr[row] : self._rated.indptr[row + 1]]] = np.nan
+        candidates = np.flatnonzero(~np.isnan(scores))
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return pd.DataFrame({"movieId": self.matrix.movie_ids[candidates], "score": scores[candidates]})
+
+    def recommend_batch(self, user_ids, n: int = 10, exclude_rated: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """Top n movieIds and their scores for each of the users, best first, from one sparse product
+        for the whole batch. A user with fewer than n movies to recommend has nan scores at the end,
+        whose movieIds are meaningless"""
+        rows = self.matrix._user_rows.get_indexer(user_ids)
+        if (rows < 0).any():
+            raise KeyError(f"Users without ratings: {np.asarray(user_ids)[rows < 0].tolist()}")
+        k = self.neighbours.shape[1]
+        weights = np.maximum(self.similarities[rows].astype(np.float64), 0.0)
+        neighbour_weights = sparse.csr_matrix(
+            (weights.ravel(), self.neighbours[rows].ravel(), np.arange(len(rows) + 1) * k),
+            shape=(len(rows), self.matrix.shape[0]),
+        )
+        weighted = (neighbour_weights @ self._centred).toarray()
+        total_weight = (neighbour_weights @ self._rated).toarray()
+        supporters = neighbour_weights.copy()
+        supporters.data = (supporters.data > 0).astype(np.float64)
+        support = (supporters @ self._rated).toarray()
+        offset = self.user_means[rows, None] if self.centred else 0.0
+        scores = offset + np.divide(
+            weighted,
+            total_weight,
+            out=np.full(weighted.shape, np.nan),
+            where=(total_weight > 0) & (support >= self.min_support),
+        )
+        if exclude_rated:
+            rated = self._rated[rows].tocoo()
+            scores[rated.row, rated.col] = np.nan
+        ranking = np.where(np.isnan(scores), -np.inf, scores)
+        n = min(n, scores.shape[1])
+        top = np.argpartition(-ranking, n - 1, axis=1)[:, :n]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(ranking, top, axis=1), axis=1, kind="stable"), axis=1)
+        return np.asarray(self.matrix.movie_ids)[top], np.take_along_axis(scores, top, axis=1)
+
+
+if __name__ == "__main__":
+    import time
+
+    df_reviews = pd.DataFrame(
+        {
+            "userId": [1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5000000, 5000000],
+            "movieId": [10, 20, 30, 10, 20, 30, 40, 10, 20, 50, 10, 20, 40, 10, 20],
+            "rating": [5.0, 4.0, 1.0, 5.0, 4.0, 1.0, 4.5, 1.0, 2.0, 5.0, 4.5, 4.0, 5.0, 5.0, 4.0],
+        }
+    )
+    knn = UserKNN(k=2).fit(df_reviews)
+    # User 2 rates just like user 1 and user 3 the opposite way
+    assert knn.user_neighbours(1).index[0] == 2
+    assert knn.user_neighbours(3).iloc[-1] < 0
+    recommended = knn.recommend(1)
+    print(recommended)
+    assert recommended["movieId"].tolist()[0] == 40
+    assert not set(recommended["movieId"]) & {10, 20, 30}
+    assert knn.predict(1, 40) > knn.user_means[knn.matrix.user_row(1)]
+
+    # Neighbours built in blocks match those from the full similarity matrix
+    rng = np.random.default_rng(10)
+    users, movies, size = 3000, 2000, 200_000
+    df_reviews = pd.DataFrame(
+        {
+            "userId": rng.integers(0, users, size),
+            "movieId": rng.integers(0, movies, size),
+            "rating": rng.integers(1, 11, size) / 2,
+        }
+    )
+    start = time.perf_counter()
+    knn = UserKNN(k=20, block_size=256).fit(df_reviews)
+    print(f"Neighbour graph of {users} users built in {time.perf_counter() - start:.2f} seconds")
+    knn_one_block = UserKNN(k=20, block_size=users).fit(df_reviews)
+    assert np.allclose(knn.similarities, knn_one_block.similarities)
+    # A memory budget smaller than block_size allows takes fewer users per block
+    knn_small_blocks = UserKNN(k=20, block_size=users, block_bytes=16 * users * 100).fit(df_reviews)
+    assert np.allclose(knn_small_blocks.similarities, knn_one_block.similarities)
+
+    centred = knn._centred.toarray()
+    norms = np.linalg.norm(centred, axis=1)
+    similarity = centred @ centred.T / np.outer(norms, norms)
+    np.fill_diagonal(similarity, -np.inf)
+    assert np.allclose(np.sort(similarity, axis=1)[:, ::-1][:, :20], knn.similarities, atol=1e-6)
+
+    # The batch gives the same recommendations as one user at a time
+    user_ids = knn.matrix.user_ids[:100]
+    knn.min_support = 2
+    batch_movies, batch_scores = knn.recommend_batch(user_ids, n=10)
+    for user_id, movies, scores in zip(user_ids, batch_movies, batch_scores):
+        recommended = knn.recommend(user_id, n=10)
+        assert np.allclose(recommended["score"], scores[: len(recommended)])
+        assert np.isnan(scores[len(recommended) :]).all()
+
+    start = time.perf_counter()
+    for user_id in user_ids:
+        knn.recommend(user_id)
+    print(f"Recommendations took {(time.perf_counter() - start) / len(user_ids) * 1000:.2f} ms per user")
@@ -1,5 +1,9 @@
+import collections
+import concurrent.futures
+import itertools as it
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 import pandas as pd
 import scipy.stats as sci_stats
 
@@ -18,33 +22,64 @@ def correlation_ratio(categorical_feature, numeric_feature):
     """Correlation Ratio measures the correlation between a categorical column and a numeric column.
     It measures the variance of the mean of the numeric column across different categories of the categorical column.
     """
-    cats, freqs = np.unique(categorical_feature, return_counts=True)
-    numeric_mean = np.mean(numeric_feature)
-    sig_y_bar = 0
-    for i in range(len(cats)):
-        category_mean = np.mean(numeric_feature[categorical_feature == cats[i]])
-        sig_y_bar += np.square(category_mean - numeric_mean) * freqs[i]
-    sig_y = np.sum(np.square(numeric_feature - numeric_mean))
+    return correlation_ratios(categorical_feature, np.asarray(numeric_feature)[:, None])[0]
+
+
+def correlation_ratios(categorical_feature, numeric_features):
+    """Correlation Ratio of each numeric column (of a 2D array or DataFrame) against one categorical column.
+    The category sums come from one sort of the categories, rather than a scan of the data per category.
+    """
+    _, codes, counts = np.unique(
+        np.asarray(categorical_feature), return_inverse=True, return_counts=True
+    )
+    values = np.asarray(numeric_features, dtype=float)
+    order = np.argsort(codes.ravel(), kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    category_sums = np.add.reduceat(values[order], starts, axis=0)
+    numeric_mean = values.mean(axis=0)
+    category_means = category_sums / counts[:, None]
+    sig_y_bar = np.sum(np.square(category_means - numeric_mean) * counts[:, None], axis=0)
+    sig_y = np.sum(np.square(values - numeric_mean), axis=0)
     statistic = np.sqrt(sig_y_bar / sig_y)
+    if isinstance(numeric_features, pd.DataFrame):
+        return pd.Series(statistic, index=numeric_features.columns)
     return statistic
 
 
+# Largest contingency table (rows x columns) built densely, beyond this only the observed pairs are counted
+DENSE_CONTINGENCY_CELLS = 1_000_000
+
+
 def cramerv(a, b):
     """Cramer’s V correlation is a measure of the correlation between two categorical columns."""
-    contingency = pd.crosstab(index=[a], columns=[b])
-    chi2 = sci_stats.chi2_contingency(contingency)[0]
-    n = np.sum(contingency.values)
-    r, k = contingency.shape
-    statistic = np.sqrt((chi2 / n) / min(r - 1, k - 1))
-    return statistic
+    return _cramerv(a, b, corrected=False)
 
 
 def cramerv_corrected(a, b):
     """Cramer’s V correlation is biased ."""
-    contingency = pd.crosstab(index=[a], columns=[b])
+    return _cramerv(a, b, corrected=True)
+
+
+def _cramerv(a, b, corrected):
+    a_codes, a_count = factorise(a)
+    b_codes, b_count = factorise(b)
+    if a_count * b_count <= DENSE_CONTINGENCY_CELLS:
+        contingency = pd.crosstab(index=[a], columns=[b])
+        return cramerv_from_contingency(contingency.values, corrected)
+    return cramerv_sparse(a_codes, a_count, b_codes, b_count, corrected)
+
+
+def cramerv_from_contingency(contingency, corrected=False):
+    """Cramer’s V from a contingency table of observed counts, with the bias correction when corrected"""
     chi2 = sci_stats.chi2_contingency(contingency)[0]
-    n = np.sum(contingency.values)
+    n = np.sum(contingency)
     r, k = contingency.shape
+    return _cramerv_from_chi2(chi2, n, r, k, corrected)
+
+
+def _cramerv_from_chi2(chi2, n, r, k, corrected):
+    if not corrected:
+        return np.sqrt((chi2 / n) / min(r - 1, k - 1))
     phi2 = chi2 / n
 
     phi2_corrected = max(0, phi2 - (k - 1) * (r - 1) / (n - 1))
@@ -54,6 +89,304 @@ def cramerv_corrected(a, b):
     statistic = np.sqrt(phi2_corrected / min(r_corrected - 1, k_corrected - 1))
     return statistic
 
+
+def sparse_contingency(a_codes, a_count, b_codes, b_count):
+    """Row code, column code and count of each pair of category codes that occurs, so memory grows with
+    the pairs seen rather than rows x columns. Rows with a missing code are left out"""
+    present = (a_codes >= 0) & (b_codes >= 0)
+    pairs, counts = np.unique(
+        a_codes[present].astype(np.int64) * b_count + b_codes[present], return_counts=True
+    )
+    return pairs // b_count, pairs % b_count, counts
+
+
+def cramerv_sparse(a_codes, a_count, b_codes, b_count, corrected=False):
+    """Cramer’s V of two factorised columns from the pairs that occur"""
+    rows, columns, counts = sparse_contingency(a_codes, a_count, b_codes, b_count)
+    return cramerv_from_pairs(rows, columns, counts, a_count, b_count, corrected)
+
+
+def cramerv_from_pairs(rows, columns, counts, a_count, b_count, corrected=False):
+    """Cramer’s V from the row code, column code and count of each pair that occurs. Pearson's chi² is
+    n * (sum(observed² / (row total * column total)) - 1), and only observed cells add to the sum"""
+    row_totals = np.bincount(rows, weights=counts, minlength=a_count)
+    column_totals = np.bincount(columns, weights=counts, minlength=b_count)
+    r = np.count_nonzero(row_totals)
+    k = np.count_nonzero(column_totals)
+    if r == 2 and k == 2:
+        # A 2 x 2 table has Yates' continuity correction applied, as the dense path does
+        contingency = np.zeros((a_count, b_count), dtype=np.int64)
+        contingency[rows, columns] = counts
+        contingency = contingency[row_totals > 0][:, column_totals > 0]
+        return cramerv_from_contingency(contingency, corrected)
+    n = counts.sum()
+    chi2 = n * (np.sum(counts**2 / (row_totals[rows] * column_totals[columns])) - 1)
+    return _cramerv_from_chi2(chi2, n, r, k, corrected)
+
+
+def factorise(feature):
+    """Integer codes (-1 where missing) and the number of categories of a column, lists are treated as
+    one category such as the genres of a movie"""
+    values = pd.Series(feature)
+    if values.dtype == object:
+        values = values.map(lambda value: tuple(value) if isinstance(value, list) else value)
+    codes, uniques = pd.factorize(values)
+    return codes, len(uniques)
+
+
+def contingency_from_codes(a_codes, a_count, b_codes, b_count):
+    """Dense contingency table counting each pair of category codes, rows with a missing code are left out.
+    Categories only seen alongside a missing value are dropped, as pd.crosstab does"""
+    present = (a_codes >= 0) & (b_codes >= 0)
+    pairs = a_codes[present].astype(np.int64) * b_count + b_codes[present]
+    contingency = np.bincount(pairs, minlength=a_count * b_count).reshape(a_count, b_count)
+    return contingency[contingency.any(axis=1)][:, contingency.any(axis=0)]
+
+
+_worker_codes = {}
+
+
+def _init_association_worker(codes):
+    """Hold the factorised columns in each worker process, so they are only sent once"""
+    _worker_codes.update(codes)
+
+
+def _cramerv_pairs(pairs, corrected):
+    """Cramer’s V for each pair of factorised columns held by the worker"""
+    results = []
+    for a, b in pairs:
+        if _worker_codes[a][1] * _worker_codes[b][1] > DENSE_CONTINGENCY_CELLS:
+            results.append(cramerv_sparse(*_worker_codes[a], *_worker_codes[b], corrected))
+            continue
+        contingency = contingency_from_codes(*_worker_codes[a], *_worker_codes[b])
+        if min(contingency.shape) < 2:
+            results.append(np.nan)
+        else:
+            results.append(cramerv_from_contingency(contingency, corrected))
+    return results
+
+
+def association_matrix(
+    df, categorical_columns=None, numeric_method="pearson", corrected=False, max_workers=None
+):
+    """Association between every pair of columns of mixed numeric and categorical item attributes.
+    Numeric pairs use Pearson (or Spearman with numeric_method), categorical and numeric pairs the
+    Correlation Ratio and categorical pairs Cramer's V. Each column is factorised once and shared by all
+    its pairs, and the categorical pairs are shared between worker processes.
+    Columns are categorical when given in categorical_columns or when they are not numeric.
+    """
+    if categorical_columns is None:
+        categorical_columns = [
+            column
+            for column in df.columns
+            if not pd.api.types.is_numeric_dtype(df[column])
+            or pd.api.types.is_bool_dtype(df[column])
+        ]
+    categorical = [column for column in df.columns if column in categorical_columns]
+    numeric = [column for column in df.columns if column not in categorical_columns]
+    position = {column: index for index, column in enumerate(df.columns)}
+    numeric_positions = [position[column] for column in numeric]
+    matrix = np.full((len(df.columns), len(df.columns)), np.nan)
+
+    # Numeric pairs in one vectorised pass, missing values dropped pairwise
+    if numeric:
+        matrix[np.ix_(numeric_positions, numeric_positions)] = df[numeric].corr(
+            method=numeric_method
+        ).to_numpy()
+
+    codes = {column: factorise(df[column]) for column in categorical}
+
+    # Each categorical column against all the numeric columns at once
+    numeric_values = df[numeric].to_numpy(dtype=float)
+    missing_numeric = np.isnan(numeric_values)
+    for column in categorical if numeric else []:
+        column_codes = codes[column][0]
+        if not missing_numeric.any():
+            present = column_codes >= 0
+            ratios = correlation_ratios(column_codes[present], numeric_values[present])
+        else:
+            ratios = []
+            for index in range(len(numeric)):
+                present = (column_codes >= 0) & ~missing_numeric[:, index]
+                ratios.append(
+                    correlation_ratio(column_codes[present], numeric_values[present, index])
+                )
+        matrix[position[column], numeric_positions] = ratios
+        matrix[numeric_positions, position[column]] = ratios
+
+    # Categorical pairs, shared out in batches to the workers
+    pairs = list(it.combinations(categorical, 2))
+    if pairs:
+        workers = min(len(pairs), max_workers or os.cpu_count() or 1)
+        if workers == 1:
+            _init_association_worker(codes)
+            values = _cramerv_pairs(pairs, corrected)
+        else:
+            batches = [pairs[start::workers] for start in range(workers)]
+            with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_init_association_worker, initargs=(codes,)
+            ) as executor:
+                results = list(executor.map(_cramerv_pairs, batches, it.repeat(corrected)))
+            values = [None] * len(pairs)
+            for start, batch_values in enumerate(results):
+                values[start::workers] = batch_values
+        for (a, b), value in zip(pairs, values):
+            matrix[position[a], position[b]] = value
+            matrix[position[b], position[a]] = value
+
+    np.fill_diagonal(matrix, 1.0)
+    return pd.DataFrame(matrix, index=df.columns, columns=df.columns)
+
+
+class PearsonAccumulator:
+    """Pearson correlation built up chunk by chunk, so the data need not all be in memory.
+    Holds the count, means and co-moments (Welford), and accumulators from different workers can be merged"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+
+    def update(self, x, y):
+        """Add a chunk of paired values"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        chunk = PearsonAccumulator()
+        chunk.n = len(x)
+        if chunk.n:
+            chunk.mean_x = x.mean()
+            chunk.mean_y = y.mean()
+            chunk.m2_x = np.sum(np.square(x - chunk.mean_x))
+            chunk.m2_y = np.sum(np.square(y - chunk.mean_y))
+            chunk.c_xy = np.sum((x - chunk.mean_x) * (y - chunk.mean_y))
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Combine with the accumulator of another chunk or worker"""
+        n = self.n + other.n
+        if not other.n:
+            return self
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        self.m2_x += other.m2_x + delta_x * delta_x * weight
+        self.m2_y += other.m2_y + delta_y * delta_y * weight
+        self.c_xy += other.c_xy + delta_x * delta_y * weight
+        self.mean_x += delta_x * other.n / n
+        self.mean_y += delta_y * other.n / n
+        self.n = n
+        return self
+
+    def statistic(self):
+        return self.c_xy / np.sqrt(self.m2_x * self.m2_y)
+
+
+class CategoryCodes:
+    """Stable integer code for each category seen, so chunks factorised separately share the same codes"""
+
+    def __init__(self):
+        self.categories = {}
+
+    def __len__(self):
+        return len(self.categories)
+
+    def codes_for(self, feature):
+        """Codes of a chunk (-1 where missing), new categories are given the next codes"""
+        chunk_codes, uniques = pd.factorize(pd.Series(feature))
+        mapping = np.array(
+            [self.categories.setdefault(category, len(self.categories)) for category in uniques],
+            dtype=np.int64,
+        )
+        if not len(mapping):
+            return np.full(len(chunk_codes), -1, dtype=np.int64)
+        return np.where(chunk_codes >= 0, mapping[chunk_codes], -1)
+
+
+class CramervAccumulator:
+    """Cramer’s V built up chunk by chunk from the counts of the category pairs seen, mergeable between workers"""
+
+    def __init__(self):
+        self.a_codes = CategoryCodes()
+        self.b_codes = CategoryCodes()
+        self.pair_counts = collections.Counter()
+
+    def update(self, a, b):
+        """Add a chunk of paired categories"""
+        a_codes = self.a_codes.codes_for(a)
+        b_codes = self.b_codes.codes_for(b)
+        rows, columns, counts = sparse_contingency(
+            a_codes, len(self.a_codes), b_codes, len(self.b_codes)
+        )
+        self.pair_counts.update(
+            dict(zip(zip(rows.tolist(), columns.tolist()), counts.tolist()))
+        )
+        return self
+
+    def merge(self, other):
+        """Combine with the accumulator of another chunk or worker, its categories are mapped to these codes"""
+        a_mapping = self.a_codes.codes_for(list(other.a_codes.categories))
+        b_mapping = self.b_codes.codes_for(list(other.b_codes.categories))
+        for (a, b), count in other.pair_counts.items():
+            self.pair_counts[a_mapping[a], b_mapping[b]] += count
+        return self
+
+    def statistic(self, corrected=False):
+        pairs = np.array(list(self.pair_counts.keys()), dtype=np.int64).reshape(-1, 2)
+        counts = np.array(list(self.pair_counts.values()), dtype=np.int64)
+        return cramerv_from_pairs(
+            pairs[:, 0], pairs[:, 1], counts, len(self.a_codes), len(self.b_codes), corrected
+        )
+
+
+class CorrelationRatioAccumulator:
+    """Correlation Ratio built up chunk by chunk from per category counts and sums, mergeable between workers"""
+
+    def __init__(self):
+        self.codes = CategoryCodes()
+        self.category_counts = np.zeros(0)
+        self.category_sums = np.zeros(0)
+        self.numeric = PearsonAccumulator()
+
+    def _grow(self, size):
+        extra = size - len(self.category_counts)
+        if extra > 0:
+            self.category_counts = np.concatenate((self.category_counts, np.zeros(extra)))
+            self.category_sums = np.concatenate((self.category_sums, np.zeros(extra)))
+
+    def update(self, categorical_feature, numeric_feature):
+        """Add a chunk of categories with their numeric values"""
+        codes = self.codes.codes_for(categorical_feature)
+        values = np.asarray(numeric_feature, dtype=float)
+        present = codes >= 0
+        codes, values = codes[present], values[present]
+        self._grow(len(self.codes))
+        self.category_counts += np.bincount(codes, minlength=len(self.codes))
+        self.category_sums += np.bincount(codes, weights=values, minlength=len(self.codes))
+        # Only the running mean and spread of the numeric values are needed
+        self.numeric.update(values, values)
+        return self
+
+    def merge(self, other):
+        """Combine with the accumulator of another chunk or worker, its categories are mapped to these codes"""
+        mapping = self.codes.codes_for(list(other.codes.categories))
+        self._grow(len(self.codes))
+        np.add.at(self.category_counts, mapping, other.category_counts)
+        np.add.at(self.category_sums, mapping, other.category_sums)
+        self.numeric.merge(other.numeric)
+        return self
+
+    def statistic(self):
+        seen = self.category_counts > 0
+        category_means = self.category_sums[seen] / self.category_counts[seen]
+        sig_y_bar = np.sum(
+            np.square(category_means - self.numeric.mean_x) * self.category_counts[seen]
+        )
+        return np.sqrt(sig_y_bar / self.numeric.m2_x)
+
+
 if __name__ == "__main__":
 
     # Set seed
@@ -64,9 +397,10 @@ if __name__ == "__main__":
     b = add_random_offset_to_array(a)
 
     # Create scatter plot
+    # One draw call for all the points, cycling through the default colours as before
     plt.figure(figsize=(8, 6), label="Spread of random data")
-    for i, val in enumerate(a):
-        plt.scatter(i, val)
+    cycle = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+    plt.scatter(np.arange(len(a)), a, c=[cycle[i % len(cycle)] for i in range(len(a))])
     plt.show()
 
     # Pearson correlation assesses linear relationships, while Spearman correlation evaluates monotonic relationships.
@@ -84,12 +418,51 @@ if __name__ == "__main__":
     # Calculate correlations
     print(f"Correlation Ratio = {correlation_ratio(a, b)}, {correlation_ratio(b, a)}")
 
+    # Correlation Ratio of many numeric columns against the one categorical column at once
+    ratios = correlation_ratios(np.round(a), np.column_stack((a, b)))
+    print(f"Correlation Ratios against rounded a = {ratios}")
+    assert np.isclose(ratios[1], correlation_ratio(np.round(a), b))
+
     # Calculate Cramer correlations
     print(f"Cramer's V Correlation = {cramerv(a, b)}, {cramerv(b, a)}")
     print(
         f"Cramer's V biased correction Correlation = {cramerv_corrected(a, b)}, {cramerv_corrected(b, a)}"
     )
 
+    # Counting only the pairs that occur gives the same result as the dense table
+    a_codes, a_count = factorise(a)
+    b_codes, b_count = factorise(b)
+    print(f"Sparse Cramer's V Correlation = {cramerv_sparse(a_codes, a_count, b_codes, b_count)}")
+    assert np.isclose(cramerv_sparse(a_codes, a_count, b_codes, b_count), cramerv(a, b))
+
+    # Build the correlations a chunk at a time in two workers, then merge
+    accumulators = [
+        (PearsonAccumulator(), CramervAccumulator(), CorrelationRatioAccumulator()) for _ in range(2)
+    ]
+    for chunk_no, start in enumerate(range(0, len(a), 100)):
+        pearson, cramer, ratio = accumulators[chunk_no % 2]
+        pearson.update(a[start : start + 100], b[start : start + 100])
+        cramer.update(np.round(a[start : start + 100]), np.round(b[start : start + 100]))
+        ratio.update(np.round(a[start : start + 100]), b[start : start + 100])
+    pearson, cramer, ratio = (
+        left.merge(right) for left, right in zip(accumulators[0], accumulators[1])
+    )
+    print(
+        f"Online Pearson = {pearson.statistic()}, Cramer's V = {cramer.statistic()}, Correlation Ratio = {ratio.statistic()}"
+    )
+    assert np.isclose(pearson.statistic(), sci_stats.pearsonr(a, b)[0])
+    assert np.isclose(cramer.statistic(), cramerv(np.round(a), np.round(b)))
+    assert np.isclose(ratio.statistic(), correlation_ratio(np.round(a), b))
+
+    # Association between every pair of attributes, the measure chosen by the column types
+    attributes = pd.DataFrame(
+        {"a": a, "b": b, "a band": np.round(a).astype(str), "b band": np.round(b).astype(str)}
+    )
+    associations = association_matrix(attributes)
+    print(associations)
+    assert np.isclose(associations.loc["a band", "b band"], cramerv(attributes["a band"], attributes["b band"]))
+    assert np.isclose(associations.loc["a", "a band"], correlation_ratio(attributes["a band"], a))
+
     x = []
     y = []
     colours = [
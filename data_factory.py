@@ -1,9 +1,24 @@
+import collections
+import concurrent.futures
 import csv
+import glob
+import hashlib
 import io
 import itertools as it
+import numpy as np
 import openpyxl
+import operator as op
+import os
 import pandas as pd
-from typing import Any, Union
+import pickle
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import requests
+import tempfile
+import time
+from requests.adapters import HTTPAdapter
+from retry import Duration, RetryLogs, RetryPolicy
+from typing import Any, Callable, Generator, Union
 
 
 class DataDesc:
@@ -81,10 +96,12 @@ class Local_Excel_Workbook_Stream(StreamUtil):
 
     def __init__(self):
         self._shape = {}
+        self._wb_obj = None
 
     def load_data(self, xlsx_name: str, **options) -> None:
         """Load a workbook"""
         self._missing_values: list[str] = options.get("missing_values", [])
+        self._wb_obj = None
         with open(xlsx_name, "rb") as excel_file:
             self._contents = excel_file.read()
 
@@ -121,32 +138,83 @@ class Local_Excel_Workbook_Stream(StreamUtil):
         return self._shape["column_count"]
 
     def load_all_data_from_workbook(self, tab_name: str = None) -> list[dict]:
-        """Loads the data from a tab in a workbook"""
-        wb_obj = openpyxl.load_workbook(
-            filename=io.BytesIO(self._contents), data_only=True
-        )
+        """Loads the data from a tab in a workbook, the workbook is only parsed once for all its tabs"""
+        if self._wb_obj is None:
+            self._wb_obj = openpyxl.load_workbook(
+                filename=io.BytesIO(self._contents), data_only=True
+            )
+        wb_obj = self._wb_obj
         # self._sheet_obj = wb_obj[tab_name] if tab_name else wb_obj["sheet1"]       if tab_name:
         self._sheet_obj = wb_obj[tab_name] if tab_name else wb_obj.active
         self._shape["row_count"] = self._sheet_obj.max_row
         self._shape["column_count"] = self._sheet_obj.max_column
         return self._sheet_obj
 
-    def to_data_frame(self) -> pd.DataFrame:
-        column_names = []
-        data_rows = []
-        for indx, row in enumerate(self._sheet_obj):
-            if indx == 0:
-                # Header row
-                for cell in row:
-                    column_names.append(cell.value)
-            else:
-                # Data row
-                data_row = []
-                for cell in row:
-                    data_row.append(cell.value)
-                data_rows.append(data_row)
+    def to_data_frame(
+        self,
+        header: bool = True,
+        index_col: Union[int, str, None] = "auto",
+        usecols: list = None,
+        min_row: int = None,
+        max_row: int = None,
+    ) -> pd.DataFrame:
+        """Convert the loaded tab to a DataFrame, pulling the cell values a row at a time in bulk.
+        index_col is the 0 based column holding the index, or "auto" to use the first column when its
+        header cell is blank (the layout Pandas writes). usecols picks columns by header name (0 based
+        position without a header) and min_row, max_row the data rows (1 based), so no other cells are read
+        """
+        sheet = self._sheet_obj
+        if header:
+            column_names = next(
+                sheet.iter_rows(min_row=1, max_row=1, values_only=True), ()
+            )
+        else:
+            column_names = tuple(range(sheet.max_column))
+        if index_col == "auto":
+            index_col = 0 if header and column_names and column_names[0] is None else None
+        if usecols is None:
+            positions = [
+                pos for pos in range(len(column_names)) if pos != index_col
+            ]
+        else:
+            missing = [name for name in usecols if name not in column_names]
+            if missing:
+                raise KeyError(f"Columns not found in {sheet.title}: {missing}")
+            positions = [column_names.index(name) for name in usecols]
+        wanted = positions + ([index_col] if index_col is not None else [])
+        if not wanted:
+            return pd.DataFrame()
+        first_col = min(wanted)
+        first_row = 2 if header else 1
+        rows = sheet.iter_rows(
+            min_row=first_row + (min_row - 1 if min_row else 0),
+            max_row=first_row + max_row - 1 if max_row else None,
+            min_col=first_col + 1,
+            max_col=max(wanted) + 1,
+            values_only=True,
+        )
+        offsets = [pos - first_col for pos in positions]
+        columns = [column_names[pos] for pos in positions]
+        if index_col is None and offsets == list(range(len(offsets))):
+            # Columns wanted are the contiguous block read, so the rows can be used as they are
+            return pd.DataFrame(list(rows), columns=columns)
+        rows = list(rows)
+        pick = (
+            op.itemgetter(*offsets)
+            if len(offsets) > 1
+            else lambda row: tuple(row[offset] for offset in offsets)
+        )
+        index = None
+        if index_col is not None:
+            index = pd.Index(
+                [row[index_col - first_col] for row in rows],
+                name=column_names[index_col],
+            )
+        return pd.DataFrame([pick(row) for row in rows], index=index, columns=columns)
 
-        return pd.DataFrame(data_rows, columns=column_names)
+    def pandas_style_to_data_frame(self) -> pd.DataFrame:
+        """When the worksheet does have headers and indices, such as one created by Pandas"""
+        return self.to_data_frame(index_col=0)
 
 
 class CSV_Raw_Stream(StreamUtil):
@@ -196,10 +264,52 @@ class CSV_DataFrame_Stream(StreamUtil):
     that uses Pandas to match the CSV data to use as a DataFrame"""
 
     def load_data(self, csv_name: str, **options) -> pd.DataFrame:
+        """Load the csv file, only the columns in usecols are parsed when given and dtype gives the type of
+        a column by name. With memory_map the file is mapped rather than read and parsed on all cores
+        into Arrow backed columns"""
         self._missing_values: list[str] = options.get("missing_values", [])
-        self._df_data = pd.read_csv(csv_name, na_values=self._missing_values)
+        usecols: list[str] = options.get("usecols")
+        dtype: dict[str, Any] = options.get("dtype")
+        if options.get("memory_map", False):
+            self._df_data = self._load_memory_mapped(csv_name, usecols, dtype)
+        else:
+            self._df_data = pd.read_csv(
+                csv_name, na_values=self._missing_values, usecols=usecols, dtype=dtype
+            )
         return self._df_data
 
+    @staticmethod
+    def _arrow_type(col_type: Any) -> pa.DataType:
+        """Arrow type for a dtype as pandas names it, so "float" stays 64 bit as it is in pandas
+        and "object" and "category" become strings and dictionary encoded strings"""
+        if col_type in ("object", "str", "string", object, str):
+            return pa.string()
+        if col_type == "category":
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.from_numpy_dtype(np.dtype(col_type))
+
+    def _load_memory_mapped(
+        self, csv_name: str, usecols: list[str], dtype: dict[str, Any]
+    ) -> pd.DataFrame:
+        """Parse with the multi-threaded pyarrow reader, columns not in usecols are skipped
+        without being converted or allocated"""
+        column_types = {
+            name: self._arrow_type(col_type) for name, col_type in (dtype or {}).items()
+        }
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=usecols or [],
+            column_types=column_types,
+            null_values=pa_csv.ConvertOptions().null_values + list(self._missing_values),
+            strings_can_be_null=True,
+        )
+        with pa.memory_map(csv_name, "r") as source:
+            table = pa_csv.read_csv(
+                source,
+                read_options=pa_csv.ReadOptions(use_threads=True),
+                convert_options=convert_options,
+            )
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
     def save_data_to_csv(self, csv_name: str) -> None:
         """Save the loaded csv file to local file (used for remote data loads)"""
         self._df_data.to_csv(csv_name, index=None)
@@ -233,34 +343,296 @@ class CSV_DataFrame_Stream(StreamUtil):
             return None
         return data
 
-    def pandas_style_to_data_frame(self):
-        """WIP: When the worksheet does have headers or indices, such as one created by Pandas"""
-        data = self._sheet_obj.values
-        cols = next(data)[1:]
-        data = list(data)
-        idx = [r[0] for r in data]
-        data = (it.islice(r, 1, None) for r in data)
-        return pd.DataFrame(data, index=idx, columns=cols)
 
+def default_http_retry_policy() -> RetryPolicy:
+    """Retry policy used for each page fetch when none is given"""
+    return (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(200))
+        .set_maximum_interval(Duration.of_seconds(30))
+        .set_backoff_coefficient(2)
+        .set_maximum_attempts(3)
+    )
 
-class CSVFactory(DataDesc):
-    """CSV Factory to read CSV files and transform to a specified data format"""
 
-    def __init__(self, **meta) -> None:
+def _http_response_ok(result: Any, retry_policy: RetryPolicy) -> bool:
+    """Connection errors, throttling and server errors are worth retrying, anything else is final"""
+    return isinstance(result, requests.Response) and not (
+        result.status_code == 429 or result.status_code >= 500
+    )
+
+
+class JSON_HTTP_DataFrame_Stream(StreamUtil):
+    """Remote loading of paginated JSON from websites and microservices stream.
+    Pages are fetched concurrently over a pooled session with each fetch run through a RetryPolicy,
+    the records are streamed as DataFrame chunks"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        retry_policy_fn: Callable[[], RetryPolicy] = default_http_retry_policy,
+        timeout: float = 30.0,
+    ) -> None:
+        self._max_workers = max_workers
+        # A policy holds the state of the attempts, so each fetch needs its own
+        self._retry_policy_fn = retry_policy_fn
+        self._timeout = timeout
+        self._retry_logs: list[RetryLogs] = []
+        self._missing_values: list[str] = []
+        # Counted as the chunks are made, so they are known when the records are only iterated
+        self._row_count = 0
+        self._column_names: list[str] = []
+        self._df_data = None
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """Release the pooled connections"""
+        self._session.close()
+
+    def _fetch_records(self, url: str, params: dict, records_key: str) -> list[dict]:
+        """Fetch one page of records, retrying on connection failures and server errors"""
+
+        def fetch() -> Any:
+            try:
+                return self._session.get(url, params=params, timeout=self._timeout)
+            except requests.RequestException as err:
+                return err
+
+        with self._retry_policy_fn() as retry:
+            retry_log = retry.run_resource(fetch, _http_response_ok)
+        self._retry_logs.append(retry_log)
+        response = retry_log[-1]["result"]
+        if isinstance(response, Exception):
+            raise response
+        response.raise_for_status()
+        payload = response.json()
+        return payload[records_key] if records_key else payload
+
+    def _to_chunk(self, records: list[dict]) -> pd.DataFrame:
+        chunk = pd.json_normalize(records)
+        if self._missing_values:
+            chunk = chunk.replace(self._missing_values, np.nan)
+        self._row_count += len(chunk)
+        self._column_names += [name for name in chunk.columns if name not in self._column_names]
+        return chunk
+
+    def iter_chunks(self, url: str, **options) -> Generator[pd.DataFrame, None, None]:
+        """Yield a DataFrame for each page in page order, until a page has no records.
+        Options are params, records_key, page_param (None for a single page), first_page, max_pages
+        and missing_values"""
+        self._missing_values = options.get("missing_values", [])
+        self._row_count = 0
+        self._column_names = []
+        self._df_data = None
+        params: dict = options.get("params", {})
+        records_key: str = options.get("records_key")
+        page_param: str = options.get("page_param", "page")
+        if page_param is None:
+            yield self._to_chunk(self._fetch_records(url, params, records_key))
+            return
+        page = options.get("first_page", 1)
+        max_pages: int = options.get("max_pages")
+        last_page = page + max_pages if max_pages is not None else None
+        with concurrent.futures.ThreadPoolExecutor(self._max_workers) as executor:
+            pending = collections.deque()
+
+            def submit_next() -> None:
+                nonlocal page
+                if last_page is None or page < last_page:
+                    pending.append(
+                        executor.submit(
+                            self._fetch_records, url, {**params, page_param: page}, records_key
+                        )
+                    )
+                    page += 1
+
+            for _ in range(self._max_workers):
+                submit_next()
+            try:
+                while pending:
+                    records = pending.popleft().result()
+                    if not records:
+                        break
+                    submit_next()
+                    yield self._to_chunk(records)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def load_data(self, url: str, **options) -> pd.DataFrame:
+        """Load every page of records into a single DataFrame"""
+        chunks = list(self.iter_chunks(url, **options))
+        self._df_data = (
+            pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        )
+        return self._df_data
+
+    @property
+    def retry_logs(self) -> list[RetryLogs]:
+        """Retry log of every page fetch, in the order the fetches completed"""
+        return self._retry_logs
+
+    @property
+    def row_count(self) -> int:
+        """Number of records loaded or iterated so far"""
+        return self._row_count
+
+    @property
+    def column_count(self) -> int:
+        """Number of columns the records loaded or iterated so far have"""
+        return len(self._column_names)
+
+    def get_column_names(self) -> list[str]:
+        """Holds a all the column name"""
+        return self._column_names
+
+    def get_column_name(self, column: int) -> str:
+        """Get the column name from column_no (1 based)"""
+        return self.get_column_names()[column - 1]
+
+    def get_row_column_contents(self, row: int, column: int):
+        """Get the value from row (1 based), column (1 based)"""
+        if self._df_data is None:
+            raise ValueError("The records were iterated rather than loaded, use load_data to read them by row")
+        return str(self._df_data.iat[row - 1, column - 1])
+
+    @staticmethod
+    def _preprocess_application_data(data: Any, missing_values: list[str]) -> Any:
+        """Changes the data to empty when any missing values are found"""
+        if data in missing_values:
+            return None
+        return data
+
+
+class LoadCache:
+    """Previously parsed tables keyed on the file identity and the load options.
+    The file identity is its path, size and modification time, or its content hash when asked for,
+    so an unchanged file is only parsed once. Recent results are held in memory (least recently used
+    are dropped first) and, when a cache_dir is given, pickled to disk to survive between runs.
+    Cached tables are shared between loads so must be copied before being modified"""
+
+    def __init__(
+        self, max_entries: int = 32, cache_dir: str = None, content_hash: bool = False
+    ) -> None:
+        self._max_entries = max_entries
+        self._cache_dir = cache_dir
+        self._content_hash = content_hash
+        self._entries: collections.OrderedDict[str, Any] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _file_identity(self, file_name: str) -> tuple:
+        stat = os.stat(file_name)
+        if not self._content_hash:
+            return (stat.st_size, stat.st_mtime_ns)
+        digest = hashlib.sha256()
+        with open(file_name, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return (stat.st_size, digest.hexdigest())
+
+    def key(self, file_name: str, output_format: str, **options) -> str:
+        """Key for the file in its current state loaded with the options into the output format"""
+        identity = (
+            os.path.abspath(file_name),
+            self._file_identity(file_name),
+            output_format,
+            sorted((name, repr(value)) for name, value in options.items()),
+        )
+        return hashlib.sha256(repr(identity).encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f"{key}.pkl")
+
+    def __contains__(self, key: str) -> bool:
+        """Whether the key has been cached, without loading the entry"""
+        return key in self._entries or bool(
+            self._cache_dir and os.path.exists(self._disk_path(key))
+        )
+
+    def get(self, key: str) -> Any:
+        """Cached entry for the key, None when it has not been cached"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        if self._cache_dir and os.path.exists(self._disk_path(key)):
+            with open(self._disk_path(key), "rb") as cache_file:
+                entry = pickle.load(cache_file)
+            self._remember(key, entry)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, entry: Any) -> None:
+        """Cache the entry in memory and on disk"""
+        self._remember(key, entry)
+        if self._cache_dir:
+            # Write then rename so a partly written entry is never read
+            fd, temp_name = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as cache_file:
+                pickle.dump(entry, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, self._disk_path(key))
+
+    def _remember(self, key: str, entry: Any) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget all the cached entries, including those on disk"""
+        self._entries.clear()
+        if self._cache_dir:
+            for name in os.listdir(self._cache_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self._cache_dir, name))
+
+
+class CachedShape:
+    """Shape of a table returned from the cache, standing in for the stream that parsed it"""
+
+    def __init__(self, row_count: int, column_count: int) -> None:
+        self.row_count = row_count
+        self.column_count = column_count
+
+
+class CachedFactory(DataDesc):
+    """Shared code for factories that can return previously parsed files from a LoadCache"""
+
+    def __init__(self, cache: LoadCache = None, **meta) -> None:
         super().__init__(**meta)
+        self._cache = cache
         self._Stream = None
 
-    def create_dataframe(self, csv_name: str, **options) -> pd.DataFrame:
-        """Creates a memory based DataFrame data format (for use in Pandas) from the loaded csv file"""
-        self._Stream = CSV_DataFrame_Stream()
-        self._data = self._Stream.load_data(csv_name, **options)
-        return self._data
-
-    def create_column_key(self, csv_name: str, **options) -> list[ColumnKey]:
-        """Creates a memory based list of Column data identified by Key data format from the loaded csv file"""
-        self._Stream = CSV_Raw_Stream()
-        self._Stream.load_data(csv_name, **options)
-        self._data = self._Stream.to_column_key()
+    def _load(
+        self, file_name: str, output_format: str, load_fn: Callable, **options
+    ) -> Any:
+        """Run load_fn to create the data unless the cache already holds it"""
+        if self._cache is None:
+            self._data = load_fn()
+            return self._data
+        key = self._cache.key(file_name, output_format, **options)
+        entry = self._cache.get(key)
+        if entry is None:
+            data = load_fn()
+            entry = (data, self._Stream.row_count, self._Stream.column_count)
+            self._cache.put(key, entry)
+        else:
+            self._Stream = CachedShape(entry[1], entry[2])
+        self._data = entry[0]
         return self._data
 
     @property
@@ -274,33 +646,92 @@ class CSVFactory(DataDesc):
         return self._Stream.column_count
 
 
-class ExcelFactory(DataDesc):
-    """Excel Factory to read Excel xlsx files and transform to a specificied data format"""
+class CSVFactory(CachedFactory):
+    """CSV Factory to read CSV files and transform to a specified data format"""
 
-    def __init__(self, **meta) -> None:
-        super().__init__(**meta)
-        self._Stream = None
+    def create_dataframe(self, csv_name: str, **options) -> pd.DataFrame:
+        """Creates a memory based DataFrame data format (for use in Pandas) from the loaded csv file"""
+
+        def load() -> pd.DataFrame:
+            self._Stream = CSV_DataFrame_Stream()
+            return self._Stream.load_data(csv_name, **options)
+
+        return self._load(csv_name, "dataframe", load, **options)
+
+    def create_column_key(self, csv_name: str, **options) -> list[ColumnKey]:
+        """Creates a memory based list of Column data identified by Key data format from the loaded csv file"""
+
+        def load() -> list[ColumnKey]:
+            self._Stream = CSV_Raw_Stream()
+            self._Stream.load_data(csv_name, **options)
+            return self._Stream.to_column_key()
+
+        return self._load(csv_name, "column_key", load, **options)
+
+
+class ExcelFactory(CachedFactory):
+    """Excel Factory to read Excel xlsx files and transform to a specificied data format"""
 
     def create_dataframe(
         self, excel_name: str, tab_name: str = None, **options
     ) -> pd.DataFrame:
-        """Creates a memory based DataFrame data format (for use in Pandas) from the loaded xlsx file"""
-        self._Stream = Local_Excel_Workbook_Stream()
-        self._Stream.load_data(excel_name, **options)
-        self._Stream.load_all_data_from_workbook(tab_name)
-        self._data = self._Stream.to_data_frame()
-        return self._data
+        """Creates a memory based DataFrame data format (for use in Pandas) from the loaded xlsx file,
+        the header, index_col, usecols, min_row and max_row options select the data converted"""
+
+        def load() -> pd.DataFrame:
+            self._Stream = Local_Excel_Workbook_Stream()
+            self._Stream.load_data(excel_name, **options)
+            self._Stream.load_all_data_from_workbook(tab_name)
+            return self._Stream.to_data_frame(
+                **{
+                    name: value
+                    for name, value in options.items()
+                    if name in ("header", "index_col", "usecols", "min_row", "max_row")
+                }
+            )
+
+        return self._load(excel_name, "dataframe", load, tab_name=tab_name, **options)
 
     def create_column_key(
         self, excel_name: str, tab_name: str = None, **options
     ) -> list[ColumnKey]:
         """Creates a memory based list of Column data identified by Key data format from the loaded xlsx file"""
-        self._Stream = Local_Excel_Workbook_Stream()
-        self._Stream.load_data(excel_name, **options)
-        self._Stream.load_all_data_from_workbook(tab_name)
-        self._data = self._Stream.to_column_key()
+
+        def load() -> list[ColumnKey]:
+            self._Stream = Local_Excel_Workbook_Stream()
+            self._Stream.load_data(excel_name, **options)
+            self._Stream.load_all_data_from_workbook(tab_name)
+            return self._Stream.to_column_key()
+
+        return self._load(excel_name, "column_key", load, tab_name=tab_name, **options)
+
+
+class JSONFactory(DataDesc):
+    """JSON Factory to read paginated JSON from websites and microservices and transform to a specified data format"""
+
+    def __init__(self, max_workers: int = 4, **meta) -> None:
+        super().__init__(**meta)
+        self._max_workers = max_workers
+        self._Stream = None
+
+    def create_dataframe(self, url: str, **options) -> pd.DataFrame:
+        """Creates a memory based DataFrame data format (for use in Pandas) from all the pages of JSON records"""
+        self._Stream = JSON_HTTP_DataFrame_Stream(self._max_workers)
+        with self._Stream:
+            self._data = self._Stream.load_data(url, **options)
         return self._data
 
+    def iter_dataframes(self, url: str, **options) -> Generator[pd.DataFrame, None, None]:
+        """Creates a DataFrame per page of JSON records, so all the records need not be held in memory"""
+        self._Stream = JSON_HTTP_DataFrame_Stream(self._max_workers)
+        with self._Stream:
+            yield from self._Stream.iter_chunks(url, **options)
+
+    @property
+    def retry_logs(self) -> list[RetryLogs]:
+        """Retry log of every page fetch"""
+        return self._Stream.retry_logs
+
     @property
     def row_count(self):
         """Number of rows the read table has"""
@@ -312,8 +743,143 @@ class ExcelFactory(DataDesc):
         return self._Stream.column_count
 
 
+class SourceResult(DataDesc):
+    """The DataFrame loaded from one file (and tab) with the time taken and any error raised"""
+
+    def __init__(self, source: str, tab_name: str = None, **meta) -> None:
+        super().__init__(source=source, tab_name=tab_name, load_time=0.0, error=None, **meta)
+
+    @property
+    def source(self) -> str:
+        return self._meta["source"]
+
+    @property
+    def tab_name(self) -> str:
+        return self._meta["tab_name"]
+
+    @property
+    def load_time(self) -> float:
+        """Time taken in seconds to parse the source"""
+        return self._meta["load_time"]
+
+    @property
+    def error(self) -> str:
+        """Description of the error raised while loading, None when loaded"""
+        return self._meta["error"]
+
+    @property
+    def ok(self) -> bool:
+        return self._meta["error"] is None
+
+    def __repr__(self) -> str:
+        return repr(self._meta)
+
+
+def _load_batch_source(
+    source: str, tab_names: list[str], options: dict
+) -> list[SourceResult]:
+    """Load every requested tab of one file, run inside a worker process so must stay module level"""
+    results = []
+    if source.lower().endswith(".xlsx"):
+        stream = Local_Excel_Workbook_Stream()
+        tabs = tab_names if tab_names else [None]
+        start = time.perf_counter()
+        try:
+            stream.load_data(source, **options)
+        except Exception as err:
+            for tab_name in tabs:
+                result = SourceResult(source, tab_name)
+                result.meta_update({"error": repr(err)})
+                results.append(result)
+            return results
+        for tab_name in tabs:
+            result = SourceResult(source, tab_name)
+            try:
+                stream.load_all_data_from_workbook(tab_name)
+                result._data = stream.to_data_frame()
+            except Exception as err:
+                result.meta_update({"error": repr(err)})
+            # The first tab also carries the cost of reading and parsing the workbook
+            end = time.perf_counter()
+            result.meta_update({"load_time": end - start})
+            start = end
+            results.append(result)
+    else:
+        result = SourceResult(source)
+        start = time.perf_counter()
+        try:
+            result._data = CSV_DataFrame_Stream().load_data(source, **options)
+        except Exception as err:
+            result.meta_update({"error": repr(err)})
+        result.meta_update({"load_time": time.perf_counter() - start})
+        results.append(result)
+    return results
+
+
+class BatchFactory(DataDesc):
+    """Batch Factory to read many CSV and Excel xlsx files (and tabs) concurrently into DataFrames.
+    Parsing is bound by the GIL so each file is loaded in its own worker process"""
+
+    def __init__(self, max_workers: int = None, **meta) -> None:
+        super().__init__(**meta)
+        self._max_workers = max_workers
+        self._results: list[SourceResult] = []
+
+    @staticmethod
+    def expand_sources(sources: list[str]) -> list[str]:
+        """Expand any glob patterns in the sources, keeping the given order"""
+        expanded = []
+        for source in sources:
+            expanded.extend(sorted(glob.glob(source)) if glob.has_magic(source) else [source])
+        return expanded
+
+    def create_results(
+        self, sources: list[str], tab_names: list[str] = None, **options
+    ) -> list[SourceResult]:
+        """Creates a DataFrame per file (and per tab for xlsx files), with the load time and any error,
+        in the order the sources were given"""
+        paths = self.expand_sources(sources)
+        if self._max_workers == 1 or len(paths) <= 1:
+            batches = [_load_batch_source(path, tab_names, options) for path in paths]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(self._max_workers) as executor:
+                futures = [
+                    executor.submit(_load_batch_source, path, tab_names, options)
+                    for path in paths
+                ]
+                batches = [future.result() for future in futures]
+        self._results = list(it.chain.from_iterable(batches))
+        self._data = self._results
+        return self._results
+
+    def create_dataframe(
+        self, sources: list[str], tab_names: list[str] = None, **options
+    ) -> pd.DataFrame:
+        """Creates a single DataFrame from all the sources that loaded, failures are kept in errors"""
+        results = self.create_results(sources, tab_names, **options)
+        frames = [result.data for result in results if result.ok]
+        self._data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return self._data
+
+    @property
+    def results(self) -> list[SourceResult]:
+        """Results of each source from the last load"""
+        return self._results
+
+    @property
+    def errors(self) -> list[SourceResult]:
+        """Sources that failed to load in the last load"""
+        return [result for result in self._results if not result.ok]
+
+    @property
+    def row_count(self):
+        """Number of rows loaded across all sources"""
+        return sum(len(result.data) for result in self._results if result.ok)
+
+
 if __name__ == "__main__":
-    factory = ExcelFactory()
+    load_cache = LoadCache()
+    factory = ExcelFactory(cache=load_cache)
     data = factory.create_column_key("sales_data_types.xlsx", missing_values=["[NULL]"])
     print(data)
     print(factory.row_count, factory.column_count)
@@ -322,6 +888,31 @@ if __name__ == "__main__":
         "sales_data_types.xlsx", "sales_data_types", missing_values=["[NULL]"]
     )
     print(factory.row_count, factory.column_count)
+
+    # Read only the columns and rows wanted, header names need not be strings
+    stream = Local_Excel_Workbook_Stream()
+    stream.load_data("sales_data_types.xlsx")
+    stream.load_all_data_from_workbook()
+    part_df = stream.to_data_frame(usecols=["Customer Name", 2017], min_row=2, max_row=3)
+    print(part_df)
+    assert part_df.columns.tolist() == ["Customer Name", 2017]
+    assert part_df["Customer Name"].tolist() == ["Smith Plumbing", "ACME Industrial"]
+    assert stream.to_data_frame(usecols=["Year"])["Year"].tolist() == df["Year"].tolist()
+
+    # A workbook written by Pandas has a blank header cell over its index column
+    with tempfile.TemporaryDirectory() as xlsx_dir:
+        xlsx_name = os.path.join(xlsx_dir, "pandas_written.xlsx")
+        df.set_index("Customer Name").rename_axis(None).to_excel(xlsx_name)
+        pandas_df = ExcelFactory().create_dataframe(xlsx_name)
+    assert pandas_df.index.tolist() == df["Customer Name"].tolist()
+    assert pandas_df.columns.tolist() == df.columns.drop("Customer Name").tolist()
+
+    # An unchanged file loaded with the same options is not parsed again
+    cached_df = ExcelFactory(cache=load_cache).create_dataframe(
+        "sales_data_types.xlsx", "sales_data_types", missing_values=["[NULL]"]
+    )
+    assert cached_df is df
+    assert load_cache.hits == 1 and load_cache.misses == 2
     # Convert the entire DataFrame
     print(df.to_csv())
     print(df.to_numpy())
@@ -330,10 +921,52 @@ if __name__ == "__main__":
     data = factory.create_column_key("sales_data_types.csv", missing_values=["[NULL]"])
     print(factory.row_count, factory.column_count)
 
+    # Cache on disk, keyed on the content so a touched but unchanged file is still a hit
+    # A copy is touched so the file in the repository keeps its times
+    with tempfile.TemporaryDirectory() as cache_dir:
+        csv_copy = os.path.join(cache_dir, "sales_data_types.csv")
+        with open("sales_data_types.csv", "rb") as source, open(csv_copy, "wb") as copy:
+            copy.write(source.read())
+        disk_cache = LoadCache(cache_dir=cache_dir, content_hash=True)
+        CSVFactory(cache=disk_cache).create_dataframe(csv_copy)
+        os.utime(csv_copy)
+        disk_cache = LoadCache(cache_dir=cache_dir, content_hash=True)
+        cached_factory = CSVFactory(cache=disk_cache)
+        cached_df = cached_factory.create_dataframe(csv_copy)
+        assert cached_factory.row_count == 5 and cached_factory.column_count == 10
+        assert disk_cache.hits == 1
+        disk_cache.put("checkpoint", [1, 2, 3])
+        assert "checkpoint" in LoadCache(cache_dir=cache_dir) and "missing" not in disk_cache
+
     df = factory.create_dataframe("sales_data_types.csv", missing_values=["[NULL]"])
     print(factory.row_count, factory.column_count)
     print(df.to_csv())
 
+    # Memory mapped, only parsing the columns needed
+    mapped_df = factory.create_dataframe(
+        "sales_data_types.csv",
+        missing_values=["[NULL]"],
+        memory_map=True,
+        usecols=["Customer Name", "Year"],
+        dtype={"Year": "int32"},
+    )
+    print(mapped_df.dtypes)
+    assert factory.row_count == 5 and factory.column_count == 2
+    assert str(mapped_df["Year"].dtype) == "int32[pyarrow]"
+    assert mapped_df["Customer Name"].tolist() == df["Customer Name"].tolist()
+    assert mapped_df["Year"].tolist() == df["Year"].tolist()
+
+    # dtype names as pandas uses them
+    typed_df = factory.create_dataframe(
+        "sales_data_types.csv",
+        memory_map=True,
+        usecols=["Customer Name", "Month", "Active"],
+        dtype={"Customer Name": "object", "Month": "float", "Active": "category"},
+    )
+    assert str(typed_df["Customer Name"].dtype) == "string[pyarrow]"
+    assert str(typed_df["Month"].dtype) == "double[pyarrow]"
+    assert typed_df["Active"].dtype.pyarrow_dtype == pa.dictionary(pa.int32(), pa.string())
+
     # Convert the entire DataFrame
     print(df.to_numpy())
 
@@ -342,3 +975,72 @@ if __name__ == "__main__":
 
     # Get Numpy array with dtypes in the result
     print(df.to_records())
+
+    # Load several files and tabs concurrently, missing files are reported not raised
+    batch = BatchFactory()
+    results = batch.create_results(
+        ["sales_data_*.csv", "sales_data_types.xlsx", "missing.csv"],
+        ["sales_data_types"],
+        missing_values=["[NULL]"],
+    )
+    for result in results:
+        print(result)
+    assert [result.ok for result in results] == [True, True, False]
+    assert results[1].tab_name == "sales_data_types"
+    assert len(batch.errors) == 1 and batch.errors[0].source == "missing.csv"
+
+    df = batch.create_dataframe(
+        ["sales_data_types.csv", "sales_data_types.csv"], missing_values=["[NULL]"]
+    )
+    assert len(df) == 2 * factory.row_count
+    assert batch.row_count == len(df)
+
+    # Load paginated JSON from a local stand-in for a remote microservice
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    failed_pages = set()
+
+    class PagedRecordsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = int(parse_qs(urlparse(self.path).query)["page"][0])
+            # The first request for page 2 fails to exercise the retry policy
+            if page == 2 and page not in failed_pages:
+                failed_pages.add(page)
+                self.send_response(503)
+                self.end_headers()
+                return
+            records = (
+                [{"movieId": page * 10 + i, "rating": {"mean": "na" if i == 2 else 3.5}} for i in range(3)]
+                if page <= 3
+                else []
+            )
+            body = json.dumps({"data": records}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PagedRecordsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/movies"
+
+    factory = JSONFactory(max_workers=2)
+    df = factory.create_dataframe(url, records_key="data", missing_values=["na"])
+    print(df)
+    assert factory.row_count == 9 and factory.column_count == 2
+    assert df["movieId"].tolist() == [10, 11, 12, 20, 21, 22, 30, 31, 32]
+    assert df["rating.mean"].isna().sum() == 3
+    assert max(log[-1]["attempt"] for log in factory.retry_logs) == 2
+
+    chunks = list(factory.iter_dataframes(url, records_key="data", max_pages=2))
+    assert [len(chunk) for chunk in chunks] == [3, 3]
+    # The counts are kept while the pages are iterated
+    assert factory.row_count == 6 and factory.column_count == 2
+    server.shutdown()
@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from typing import Iterable
+
+PROFILE_COLUMNS = ["count", "nulls", "null_percent", "distinct", "min", "max", "mean", "std", "25%", "50%", "75%"]
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch in bounded memory. Values are buffered at level 0; a full level
+    is sorted and every other value promoted to the level above with twice the weight, so about
+    k values are kept per level and a quantile's rank is within a few percent for k of 200"""
+
+    def __init__(self, k: int = 200) -> None:
+        self.k = k
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self._offset = 0
+
+    def update(self, values: np.ndarray) -> None:
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+        self._compact()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for height, values in enumerate(other.levels):
+            if height == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[height] = np.concatenate([self.levels[height], values])
+        self._compact()
+
+    def _compact(self) -> None:
+        height = 0
+        while height < len(self.levels):
+            if len(self.levels[height]) > self.k:
+                values = np.sort(self.levels[height])
+                # Keep an even count at this level and alternate which half is promoted to avoid bias
+                spare = values[: len(values) % 2]
+                promoted = values[len(spare) + self._offset :: 2]
+                self._offset ^= 1
+                self.levels[height] = spare
+                if height + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[height + 1] = np.concatenate([self.levels[height + 1], promoted])
+            height += 1
+
+    def quantiles(self, qs) -> np.ndarray:
+        values = np.concatenate(self.levels)
+        if not len(values):
+            return np.full(len(qs), np.nan)
+        weights = np.concatenate([np.full(len(level), 2.0**height) for height, level in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        ranks = np.cumsum(weights[order])
+        positions = np.searchsorted(ranks, np.asarray(qs) * ranks[-1], side="left")
+        return values[order][np.minimum(positions, len(values) - 1)]
+
+
+class DistinctSketch:
+    """Distinct count from the k smallest 64 bit hashes seen: exact below k distinct values,
+    otherwise estimated as (k - 1) / (k-th smallest hash as a fraction of the hash range)"""
+
+    def __init__(self, k: int = 4096) -> None:
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, values: pd.Series) -> None:
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        self.hashes = np.unique(np.concatenate([self.hashes, hashes]))[: self.k]
+
+    def merge(self, other: "DistinctSketch") -> None:
+        self.hashes = np.unique(np.concatenate([self.hashes, other.hashes]))[: self.k]
+
+    def estimate(self) -> int:
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        return round((self.k - 1) / (self.hashes[-1].item() / 2.0**64))
+
+
+class ColumnProfile:
+    """Running profile of one column, updated a chunk at a time in memory bounded by the sketches"""
+
+    def __init__(self, max_categories: int = 50, distinct_k: int = 4096, quantile_k: int = 200) -> None:
+        self.max_categories = max_categories
+        self.count = 0
+        self.nulls = 0
+        self.numeric = True
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.value_counts: pd.Series = pd.Series(dtype=np.int64)
+        self.distinct = DistinctSketch(distinct_k)
+        self.quantiles = QuantileSketch(quantile_k)
+
+    def update(self, values: pd.Series, nulls: int = None) -> None:
+        """Add a chunk of the column; nulls counts missing values not included in the chunk, such
+        as the cells a sparse matrix does not store"""
+        missing = values.isna()
+        present = values[~missing]
+        self.count += len(present)
+        self.nulls += int(missing.sum()) + (nulls or 0)
+        if len(present) == 0:
+            return
+        self.distinct.update(present)
+        if self.value_counts is not None:
+            self.value_counts = self.value_counts.add(present.value_counts(), fill_value=0).astype(np.int64)
+            if len(self.value_counts) > self.max_categories:
+                self.value_counts = None
+        self.numeric = self.numeric and pd.api.types.is_numeric_dtype(present) and not pd.api.types.is_bool_dtype(present)
+        if self.numeric:
+            self._update_numeric(present.to_numpy(dtype=np.float64))
+
+    def _update_numeric(self, values: np.ndarray) -> None:
+        # Chan et al. parallel merge of the chunk's mean and sum of squares into the running ones
+        count, mean = len(values), values.mean()
+        total = self.count
+        delta = mean - self._mean
+        self._m2 += ((values - mean) ** 2).sum() + delta**2 * (total - count) * count / total
+        self._mean += delta * count / total
+        self.minimum = min(self.minimum, values.min())
+        self.maximum = max(self.maximum, values.max())
+        self.quantiles.update(values)
+
+    def summary(self) -> dict:
+        rows = self.count + self.nulls
+        summary = {
+            "count": self.count,
+            "nulls": self.nulls,
+            "null_percent": 100 * self.nulls / rows if rows else np.nan,
+            "distinct": self.distinct.estimate(),
+        }
+        if self.numeric and self.count:
+            q25, q50, q75 = self.quantiles.quantiles([0.25, 0.5, 0.75])
+            summary.update(
+                {
+                    "min": self.minimum,
+                    "max": self.maximum,
+                    "mean": self._mean,
+                    "std": np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.nan,
+                    "25%": q25,
+                    "50%": q50,
+                    "75%": q75,
+                }
+            )
+        return summary
+
+    def histogram(self, bins: int = 10) -> pd.Series:
+        """Count of each value while there are few of them, otherwise, for numbers, approximate
+        counts between quantile based bin edges"""
+        if self.value_counts is not None:
+            return self.value_counts.sort_index() if self.numeric else self.value_counts.sort_values(ascending=False)
+        if not self.numeric:
+            return pd.Series(dtype=np.int64)
+        edges = np.unique(self.quantiles.quantiles(np.linspace(0, 1, bins + 1)))
+        edges[0], edges[-1] = self.minimum, self.maximum
+        values = np.concatenate(self.quantiles.levels)
+        weights = np.concatenate([np.full(len(level), 2**height) for height, level in enumerate(self.quantiles.levels)])
+        counts, edges = np.histogram(values, bins=edges, weights=weights)
+        return pd.Series(counts.astype(np.int64), index=pd.IntervalIndex.from_breaks(edges))
+
+
+class DatasetProfiler:
+    """Profile of every column of a dataset in one pass over its chunks: null counts, distinct
+    counts, value histograms and min, max, mean, std and quartiles, the figures isnull().sum(),
+    value_counts() and describe() each needed a full pass for"""
+
+    def __init__(self, max_categories: int = 50, distinct_k: int = 4096, quantile_k: int = 200) -> None:
+        self._settings = {"max_categories": max_categories, "distinct_k": distinct_k, "quantile_k": quantile_k}
+        self.columns: dict[str, ColumnProfile] = {}
+        self.rows = 0
+
+    def _column(self, name) -> ColumnProfile:
+        if name not in self.columns:
+            self.columns[name] = ColumnProfile(**self._settings)
+            # Rows seen before the column first appeared are missing values
+            self.columns[name].nulls = self.rows
+        return self.columns[name]
+
+    def update(self, chunk: pd.DataFrame) -> "DatasetProfiler":
+        for name in chunk.columns:
+            self._column(name).update(chunk[name])
+        for name in self.columns.keys() - set(chunk.columns):
+            self.columns[name].nulls += len(chunk)
+        self.rows += len(chunk)
+        return self
+
+    def update_sparse(self, name: str, matrix: sparse.spmatrix, chunk_size: int = 1_000_000) -> "DatasetProfiler":
+        """Profile the stored values of a sparse matrix, such as the ratings of a users x movies
+        matrix, as one column, with every cell it does not store counted as missing"""
+        values = sparse.csr_matrix(matrix).data
+        column = self._column(name)
+        for start in range(0, len(values), chunk_size):
+            column.update(pd.Series(values[start : start + chunk_size]))
+        column.nulls += matrix.shape[0] * matrix.shape[1] - matrix.nnz
+        self.rows = max(self.rows, matrix.shape[0] * matrix.shape[1])
+        return self
+
+    def profile(self) -> pd.DataFrame:
+        """One row of figures per column"""
+        return pd.DataFrame(
+            [column.summary() for column in self.columns.values()], index=list(self.columns), columns=PROFILE_COLUMNS
+        )
+
+    def histograms(self, bins: int = 10) -> dict[str, pd.Series]:
+        return {name: column.histogram(bins) for name, column in self.columns.items()}
+
+
+def profile(chunks: Iterable[pd.DataFrame], **settings) -> DatasetProfiler:
+    """Profile the chunks of a dataset, as from read_csv with a chunksize or a stream's iter_chunks"""
+    profiler = DatasetProfiler(**settings)
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler
+
+
+if __name__ == "__main__":
+    import io
+    import time
+
+    rng = np.random.default_rng(10)
+    size = 1_000_000
+    df_reviews = pd.DataFrame(
+        {
+            "userId": rng.integers(0, 200_000, size),
+            "movieId": rng.integers(0, 50_000, size),
+            "rating": rng.integers(1, 11, size) / 2,
+            "timestamp": rng.integers(964981247, 1262390400, size),
+            "device": rng.choice(np.array(["phone", "computer", "tv"], dtype=object), size),
+        }
+    )
+    df_reviews.loc[rng.integers(0, size, 5000), "rating"] = np.nan
+    df_reviews.loc[rng.integers(0, size, 300_000), "device"] = None
+
+    start = time.perf_counter()
+    profiler = profile(df_reviews.iloc[start : start + 100_000] for start in range(0, size, 100_000))
+    report = profiler.profile()
+    print(report)
+    print(f"Profiled in {time.perf_counter() - start:.2f} seconds")
+
+    assert report.loc["rating", "nulls"] == df_reviews["rating"].isnull().sum()
+    assert np.allclose(report["null_percent"], df_reviews.isnull().sum() / len(df_reviews) * 100)
+    described = df_reviews.describe()
+    for column in ["userId", "movieId", "rating", "timestamp"]:
+        assert report.loc[column, "min"] == described.loc["min", column]
+        assert report.loc[column, "max"] == described.loc["max", column]
+        assert np.isclose(report.loc[column, "mean"], described.loc["mean", column])
+        assert np.isclose(report.loc[column, "std"], described.loc["std", column])
+        spread = described.loc["max", column] - described.loc["min", column]
+        for quartile in ["25%", "50%", "75%"]:
+            assert abs(report.loc[column, quartile] - described.loc[quartile, column]) <= 0.03 * spread
+        exact_distinct = df_reviews[column].nunique()
+        assert abs(report.loc[column, "distinct"] - exact_distinct) <= 0.05 * exact_distinct
+
+    histograms = profiler.histograms()
+    assert histograms["rating"].equals(df_reviews["rating"].value_counts().sort_index().rename(None).rename_axis(None))
+    assert histograms["device"].to_dict() == df_reviews["device"].value_counts().to_dict()
+    assert histograms["userId"].sum() == size
+
+    # Streamed csv chunks, with a column only in some rows
+    csv = io.StringIO("userId,movieId,rating\n1,1,4.0\n1,3,na\n2,1,5.0\n")
+    streamed = profile(pd.read_csv(csv, chunksize=2, na_values=["na"])).update(pd.DataFrame({"device": ["tv"]}))
+    streamed_report = streamed.profile()
+    assert streamed_report.loc["rating", "nulls"] == 2 and streamed_report.loc["device", "nulls"] == 3
+
+    # Sparse users x movies ratings, the unrated cells counting as missing
+    matrix = sparse.random(2000, 1000, density=0.01, format="csr", random_state=10)
+    matrix.data = np.ceil(matrix.data * 10) / 2
+    sparse_report = DatasetProfiler().update_sparse("rating", matrix).profile()
+    assert sparse_report.loc["rating", "nulls"] == 2000 * 1000 - matrix.nnz
+    assert np.isclose(sparse_report.loc["rating", "mean"], matrix.data.mean())
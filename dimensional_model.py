@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from movie_index import split_title_year
+
+UNKNOWN_DEVICE = "unknown"
+
+# Dimension owning each attribute that can be joined onto the ratings facts
+DIMENSIONS = {
+    "user": ("user_key", ["userId"]),
+    "movie": ("movie_key", ["movieId", "title", "year", "genres"]),
+    "device": ("device_key", ["device"]),
+    "date": ("date_key", ["date_id", "date", "year_rated", "month", "weekday"]),
+}
+
+
+def _smallest_int(count: int):
+    """Smallest signed integer type that holds keys up to count"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if count < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class StarSchema:
+    """Ratings stored as a star: a narrow fact table of integer keys and the rating, with
+    dimension tables for users, movies, devices and dates. The key of a dimension row is its
+    position, so a join is an array lookup by key rather than a merge, and attributes are only
+    joined on when a query asks for them"""
+
+    def __init__(self, facts: pd.DataFrame, dimensions: dict[str, pd.DataFrame], rejected: int = 0) -> None:
+        self.facts = facts
+        self.dimensions = dimensions
+        # Reviews left out of the facts for having no user, movie or time
+        self.rejected = rejected
+
+    @classmethod
+    def from_frames(cls, df_reviews: pd.DataFrame, df_movie_titles: pd.DataFrame) -> "StarSchema":
+        """Build from reviews (userId, movieId, rating, timestamp and optionally device) and the
+        movie titles (movieId, title with the year in brackets, pipe separated genres).
+        Reviews of movies missing from the titles are kept, with an unknown title. Reviews without
+        a userId, movieId or timestamp have no dimension row to key and are left out and counted"""
+        complete = df_reviews[["userId", "movieId", "timestamp"]].notna().all(axis=1)
+        rejected = int((~complete).sum())
+        df_reviews = df_reviews[complete]
+        user_codes, user_ids = pd.factorize(df_reviews["userId"], sort=True)
+        dim_user = pd.DataFrame({"userId": user_ids})
+
+        movie_ids = pd.Index(df_movie_titles["movieId"]).union(pd.Index(df_reviews["movieId"].unique()))
+        titles = df_movie_titles.set_index("movieId").reindex(movie_ids)
+        split = [split_title_year(str(title)) if isinstance(title, str) else (None, None) for title in titles["title"]]
+        dim_movie = pd.DataFrame(
+            {
+                "movieId": movie_ids.to_numpy(),
+                "title": pd.array([title.strip() if title else None for title, _ in split], dtype="string"),
+                "year": pd.array([year for _, year in split], dtype="Int16"),
+                "genres": pd.array(titles["genres"] if "genres" in titles else [None] * len(titles), dtype="string"),
+            }
+        )
+        movie_codes = movie_ids.get_indexer(df_reviews["movieId"])
+
+        devices = df_reviews["device"] if "device" in df_reviews else pd.Series(index=df_reviews.index, dtype=object)
+        devices = devices.where(devices.notna() & (devices != 0), UNKNOWN_DEVICE).astype(str)
+        device_codes, device_names = pd.factorize(devices, sort=True)
+        dim_device = pd.DataFrame({"device": pd.array(device_names, dtype="string")})
+
+        rated_on = pd.to_datetime(df_reviews["timestamp"], unit="s").dt.normalize()
+        date_codes, dates = pd.factorize(rated_on, sort=True)
+        dates = pd.DatetimeIndex(dates)
+        dim_date = pd.DataFrame(
+            {
+                "date_id": (dates.year * 10000 + dates.month * 100 + dates.day).astype(np.int32),
+                "date": dates,
+                "year_rated": dates.year.astype(np.int16),
+                "month": dates.month.astype(np.int8),
+                "weekday": pd.Categorical(dates.day_name()),
+            }
+        )
+
+        facts = pd.DataFrame(
+            {
+                "user_key": user_codes.astype(_smallest_int(len(dim_user))),
+                "movie_key": movie_codes.astype(_smallest_int(len(dim_movie))),
+                "device_key": device_codes.astype(_smallest_int(len(dim_device))),
+                "date_key": date_codes.astype(_smallest_int(len(dim_date))),
+                "rating": df_reviews["rating"].to_numpy(dtype=np.float32),
+            }
+        )
+        return cls(facts, {"user": dim_user, "movie": dim_movie, "device": dim_device, "date": dim_date}, rejected)
+
+    @staticmethod
+    def _dimension_of(name: str) -> tuple[str, str]:
+        """Dimension and fact key of an attribute"""
+        for dimension, (key, attributes) in DIMENSIONS.items():
+            if name in attributes:
+                return dimension, key
+        raise KeyError(f"{name} is not an attribute of any dimension")
+
+    def join(self, *attributes: str, facts: pd.DataFrame = None) -> pd.DataFrame:
+        """Ratings facts, all of them or those given, with the named dimension attributes looked up by key"""
+        facts = self.facts if facts is None else facts
+        joined = facts.reset_index(drop=True)
+        for name in attributes:
+            dimension, key = self._dimension_of(name)
+            column = self.dimensions[dimension][name].take(facts[key].to_numpy())
+            joined[name] = column.reset_index(drop=True)
+        return joined
+
+    def aggregate(self, by: str, measures=("mean", "count")) -> pd.DataFrame:
+        """Rating measures per member of a dimension, grouped on the integer key and only then
+        labelled with the dimension's attributes"""
+        key, attributes = DIMENSIONS[by]
+        grouped = self.facts.groupby(key, sort=True)["rating"].agg(list(measures))
+        labels = self.dimensions[by].take(grouped.index.to_numpy())[attributes]
+        return pd.concat([labels.reset_index(drop=True), grouped.reset_index(drop=True)], axis=1)
+
+    def memory_usage(self) -> int:
+        """Bytes held by the facts and all the dimensions"""
+        tables = [self.facts, *self.dimensions.values()]
+        return sum(int(table.memory_usage(deep=True).sum()) for table in tables)
+
+
+if __name__ == "__main__":
+    import time
+
+    df_movie_titles = pd.DataFrame(
+        {
+            "movieId": [1, 3, 72998],
+            "title": ["Toy Story (1995)", "Grumpier Old Men (1995)", "Avatar (2009)"],
+            "genres": ["Adventure|Animation|Children|Comedy|Fantasy", "Comedy|Romance", "Action|Adventure|Sci-Fi|IMAX"],
+        }
+    )
+    df_reviews = pd.DataFrame(
+        {
+            "userId": [5000000, 5000000, 5000000, 21, 21],
+            "movieId": [1, 3, 1, 72998, 2],
+            "rating": [1.0, 4.0, 3.8, 4.5, 3.0],
+            "timestamp": [964981247, 964982703, 964982703, 1262304000, 1262390400],
+            "device": ["phone", "computer", "tv", None, None],
+        }
+    )
+    star = StarSchema.from_frames(df_reviews, df_movie_titles)
+    print(star.facts)
+    assert list(star.facts.columns) == ["user_key", "movie_key", "device_key", "date_key", "rating"]
+    assert star.facts["user_key"].dtype == np.int8
+    assert star.dimensions["device"]["device"].tolist() == ["computer", "phone", "tv", "unknown"]
+    assert star.dimensions["movie"]["year"].tolist()[-1] == 2009
+
+    joined = star.join("userId", "title", "year", "device", "date")
+    print(joined)
+    assert joined["title"].tolist()[3] == "Avatar"
+    assert pd.isna(joined["title"][4])
+    assert joined["device"].tolist() == ["phone", "computer", "tv", "unknown", "unknown"]
+    assert joined["date"][3] == pd.Timestamp("2010-01-01")
+
+    # Reviews missing a key are left out rather than joined to another dimension row
+    incomplete = pd.concat(
+        [df_reviews, pd.DataFrame({"userId": [np.nan, 7], "movieId": [1, np.nan], "rating": [2.0, 2.0], "timestamp": [964981247, np.nan]})],
+        ignore_index=True,
+    )
+    incomplete_star = StarSchema.from_frames(incomplete, df_movie_titles)
+    assert incomplete_star.rejected == 2 and len(incomplete_star.facts) == len(df_reviews)
+    assert (incomplete_star.facts[["user_key", "movie_key", "date_key"]] >= 0).all().all()
+    assert incomplete_star.dimensions["user"]["userId"].notna().all()
+
+    per_movie = star.aggregate("movie")
+    print(per_movie)
+    toy_story = per_movie[per_movie["movieId"] == 1].iloc[0]
+    assert toy_story["count"] == 2 and abs(toy_story["mean"] - 2.4) < 1e-6
+    assert star.aggregate("device", ["count"])["count"].sum() == len(df_reviews)
+
+    # Compared with merging the titles onto every review
+    rng = np.random.default_rng(10)
+    movies, size = 20_000, 1_000_000
+    df_movie_titles = pd.DataFrame(
+        {
+            "movieId": np.arange(movies),
+            "title": [f"Movie number {index} ({1950 + index % 70})" for index in range(movies)],
+            "genres": np.array(["Comedy|Romance", "Action|Adventure|Sci-Fi", "Drama"])[np.arange(movies) % 3],
+        }
+    )
+    df_reviews = pd.DataFrame(
+        {
+            "userId": rng.integers(0, 100_000, size),
+            "movieId": rng.integers(0, movies, size),
+            "rating": rng.integers(1, 11, size) / 2,
+            "timestamp": rng.integers(964981247, 1262390400, size),
+        }
+    )
+    start = time.perf_counter()
+    df = pd.merge(df_reviews, df_movie_titles, on="movieId")
+    merged_means = df.groupby("title")["rating"].mean()
+    merge_time = time.perf_counter() - start
+    merged_bytes = int(df.memory_usage(deep=True).sum())
+
+    star = StarSchema.from_frames(df_reviews, df_movie_titles)
+    start = time.perf_counter()
+    star_means = star.aggregate("movie", ["mean"])
+    star_time = time.perf_counter() - start
+    print(
+        f"Merged frame {merged_bytes / 1e6:.0f} MB, means in {merge_time:.2f}s; "
+        f"star schema {star.memory_usage() / 1e6:.0f} MB, means in {star_time:.2f}s"
+    )
+    assert star.memory_usage() < merged_bytes / 4
+    titles = star_means["title"] + " (" + star_means["year"].astype(str) + ")"
+    assert np.allclose(star_means["mean"].to_numpy(), merged_means.reindex(titles).to_numpy())
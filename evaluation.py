@@ -0,0 +1,184 @@
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import time
+import tracemalloc
+from collaborative_filtering import UserKNN
+from typing import Callable
+
+
+def time_split(df_reviews: pd.DataFrame, test_fraction: float = 0.2) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Split the reviews at the timestamp leaving test_fraction of them after it, so engines are
+    trained on the past and tested on what users went on to rate. Only users and movies seen in
+    training can be tested"""
+    cutoff = df_reviews["timestamp"].quantile(1 - test_fraction)
+    df_train = df_reviews[df_reviews["timestamp"] <= cutoff]
+    df_test = df_reviews[df_reviews["timestamp"] > cutoff]
+    df_test = df_test[df_test["userId"].isin(df_train["userId"]) & df_test["movieId"].isin(df_train["movieId"])]
+    return df_train, df_test
+
+
+class PopularityEngine:
+    """Baseline recommending the most rated movies the user has not rated yet"""
+
+    def fit(self, df_reviews: pd.DataFrame) -> "PopularityEngine":
+        counts = df_reviews["movieId"].value_counts()
+        self._ranked = counts.index.to_numpy()
+        self._rated = df_reviews.groupby("userId")["movieId"].agg(set)
+        return self
+
+    def recommend_batch(self, user_ids, n: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        candidates = self._ranked[: n + max((len(self._rated.get(user_id, ())) for user_id in user_ids), default=0)]
+        movies = np.zeros((len(user_ids), n), dtype=self._ranked.dtype)
+        scores = np.full((len(user_ids), n), np.nan)
+        for position, user_id in enumerate(user_ids):
+            rated = self._rated.get(user_id, set())
+            unrated = [movie for movie in candidates if movie not in rated][:n]
+            movies[position, : len(unrated)] = unrated
+            scores[position, : len(unrated)] = -np.arange(len(unrated))
+        return movies, scores
+
+
+def ranking_metrics(
+    recommended: np.ndarray, valid: np.ndarray, user_rows: np.ndarray, relevant_keys: np.ndarray, relevant_counts: np.ndarray, movie_count: int
+) -> dict[str, np.ndarray]:
+    """Precision, recall and NDCG at k for a block of users. Hits are found by looking the
+    (user, movie) keys of the recommendations up in the sorted keys of the relevant test ratings,
+    so the relevance matrix is never made dense"""
+    k = recommended.shape[1]
+    keys = user_rows[:, None].astype(np.int64) * movie_count + recommended
+    hits = np.isin(keys, relevant_keys) & valid
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    ideal = np.cumsum(discounts)[np.minimum(relevant_counts, k) - 1]
+    return {
+        "precision": hits.sum(axis=1) / k,
+        "recall": hits.sum(axis=1) / relevant_counts,
+        "ndcg": (hits * discounts).sum(axis=1) / ideal,
+    }
+
+
+def _evaluate_block(engine, user_ids, user_rows, k, relevant_keys, relevant_counts, movie_codes) -> tuple[dict, np.ndarray, float]:
+    start = time.perf_counter()
+    movies, scores = engine.recommend_batch(user_ids, n=k)
+    elapsed = time.perf_counter() - start
+    valid = ~np.isnan(scores)
+    recommended = movie_codes.get_indexer(movies.ravel()).reshape(movies.shape)
+    valid &= recommended >= 0
+    metrics = ranking_metrics(recommended, valid, user_rows, relevant_keys, relevant_counts, len(movie_codes))
+    return metrics, np.unique(recommended[valid]), elapsed
+
+
+def evaluate(
+    df_reviews: pd.DataFrame,
+    engines: dict[str, Callable[[], object]],
+    k: int = 10,
+    test_fraction: float = 0.2,
+    relevant_rating: float = 4.0,
+    block_size: int = 512,
+    max_workers: int = None,
+) -> pd.DataFrame:
+    """Quality and cost of each engine configuration on the same time based split. Each engine is
+    made by its factory, fitted on the training reviews and asked for the top k of every test user
+    in blocks run on a thread pool. Test ratings of at least relevant_rating are the ones it should
+    find. Reports precision, recall and NDCG at k averaged over test users, the share of the catalogue
+    recommended to anyone, the build time and peak memory allocated while building, and the mean
+    query time per user"""
+    df_train, df_test = time_split(df_reviews, test_fraction)
+    df_relevant = df_test[df_test["rating"] >= relevant_rating]
+    movie_codes = pd.Index(np.sort(df_train["movieId"].unique()))
+    test_users = np.sort(df_relevant["userId"].unique())
+    user_rows = np.arange(len(test_users))
+    relevant_keys = np.unique(
+        pd.Index(test_users).get_indexer(df_relevant["userId"]).astype(np.int64) * len(movie_codes)
+        + movie_codes.get_indexer(df_relevant["movieId"])
+    )
+    relevant_counts = np.bincount(relevant_keys // len(movie_codes), minlength=len(test_users))
+
+    results = []
+    for name, make_engine in engines.items():
+        tracemalloc.start()
+        start = time.perf_counter()
+        engine = make_engine().fit(df_train)
+        build_time = time.perf_counter() - start
+        build_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        blocks = [slice(first, first + block_size) for first in range(0, len(test_users), block_size)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            evaluated = list(
+                executor.map(
+                    lambda block: _evaluate_block(
+                        engine, test_users[block], user_rows[block], k, relevant_keys, relevant_counts[block], movie_codes
+                    ),
+                    blocks,
+                )
+            )
+        metrics = {
+            metric: np.concatenate([block_metrics[metric] for block_metrics, _, _ in evaluated])
+            for metric in ("precision", "recall", "ndcg")
+        }
+        covered = np.unique(np.concatenate([block_movies for _, block_movies, _ in evaluated])) if evaluated else []
+        query_time = sum(elapsed for _, _, elapsed in evaluated)
+        results.append(
+            {
+                "engine": name,
+                f"precision@{k}": metrics["precision"].mean(),
+                f"recall@{k}": metrics["recall"].mean(),
+                f"ndcg@{k}": metrics["ndcg"].mean(),
+                "coverage": len(covered) / len(movie_codes),
+                "build_seconds": build_time,
+                "build_peak_mb": build_peak / 1e6,
+                "query_ms_per_user": 1000 * query_time / max(len(test_users), 1),
+                "test_users": len(test_users),
+            }
+        )
+    return pd.DataFrame(results).set_index("engine")
+
+
+if __name__ == "__main__":
+    # Users in communities that like the same movies, rating them over time
+    rng = np.random.default_rng(10)
+    communities, users_per_community, movies_per_community, size = 20, 100, 300, 200_000
+    users = rng.integers(0, communities * users_per_community, size)
+    liked = rng.random(size) < 0.7
+    movies = np.where(
+        liked,
+        (users // users_per_community) * movies_per_community + rng.integers(0, movies_per_community, size),
+        rng.integers(0, communities * movies_per_community, size),
+    )
+    df_reviews = pd.DataFrame(
+        {
+            "userId": users,
+            "movieId": movies,
+            "rating": np.where(liked, rng.choice([4.0, 4.5, 5.0], size), rng.choice([1.0, 2.0, 3.0], size)),
+            "timestamp": rng.integers(964981247, 1262390400, size),
+        }
+    ).drop_duplicates(["userId", "movieId"])
+
+    df_train, df_test = time_split(df_reviews)
+    assert df_train["timestamp"].max() < df_test["timestamp"].min()
+    assert set(df_test["userId"]) <= set(df_train["userId"])
+
+    # Two hits in three for a user with four relevant movies
+    metrics = ranking_metrics(
+        np.array([[3, 1, 7]]), np.array([[True, True, True]]), np.array([0]), np.array([1, 2, 3, 4]), np.array([4]), 10
+    )
+    assert np.isclose(metrics["precision"][0], 2 / 3) and np.isclose(metrics["recall"][0], 0.5)
+    assert np.isclose(metrics["ndcg"][0], (1 + 1 / np.log2(3)) / (1 + 1 / np.log2(3) + 1 / np.log2(4)))
+
+    report = evaluate(
+        df_reviews,
+        {
+            "popularity": PopularityEngine,
+            "user_knn k=10": lambda: UserKNN(k=10),
+            "user_knn k=50": lambda: UserKNN(k=50),
+            "user_knn k=50 min_support=5": lambda: UserKNN(k=50, min_support=5),
+        },
+    )
+    pd.set_option("display.max_columns", None)
+    print(report)
+    assert report.loc["user_knn k=10", "ndcg@10"] > 10 * report.loc["popularity", "ndcg@10"]
+    assert report.loc["user_knn k=10", "coverage"] > report.loc["popularity", "coverage"]
+    # Requiring more than one neighbour to agree recovers the quality lost to a larger k
+    assert report.loc["user_knn k=50 min_support=5", "ndcg@10"] > 10 * report.loc["user_knn k=50", "ndcg@10"]
+    assert (report["build_peak_mb"] > 0).all()
@@ -0,0 +1,303 @@
+import concurrent.futures
+import contextlib
+import json
+import numpy as np
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from typing import Any, Iterator
+
+SNAPSHOT_PREFIX = "v"
+METADATA_FILE = "metadata.json"
+CURRENT_FILE = "CURRENT"
+
+
+def snapshot_versions(root: str) -> list[int]:
+    """Versions of the complete snapshots under root, oldest first"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        int(name[len(SNAPSHOT_PREFIX) :])
+        for name in os.listdir(root)
+        if name.startswith(SNAPSHOT_PREFIX) and name[len(SNAPSHOT_PREFIX) :].isdigit()
+    )
+
+
+def snapshot_path(root: str, version: int) -> str:
+    return os.path.join(root, f"{SNAPSHOT_PREFIX}{version:06d}")
+
+
+def save_snapshot(root: str, arrays: dict[str, np.ndarray], metadata: dict = None) -> int:
+    """Write the built artefacts as the next version under root and return the version.
+    The snapshot is written to a temporary directory and renamed into place, so readers only
+    ever see complete snapshots, and its files are made read only as it is never changed"""
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.asarray(array), allow_pickle=False)
+        description = {
+            "created": time.time(),
+            "arrays": {name: [str(np.asarray(array).dtype), list(np.shape(array))] for name, array in arrays.items()},
+            "metadata": metadata or {},
+        }
+        with open(os.path.join(staging, METADATA_FILE), "w") as file:
+            json.dump(description, file)
+        for name in os.listdir(staging):
+            os.chmod(os.path.join(staging, name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        while True:
+            version = (snapshot_versions(root) or [0])[-1] + 1
+            try:
+                # Fails rather than replaces if another writer took the version first
+                os.rename(staging, snapshot_path(root, version))
+                return version
+            except OSError:
+                if not os.path.exists(snapshot_path(root, version)):
+                    raise
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def publish(root: str, version: int) -> None:
+    """Record the version to serve, atomically, so a restarted service loads the same one"""
+    handle, temporary = tempfile.mkstemp(dir=root)
+    with os.fdopen(handle, "w") as file:
+        file.write(str(version))
+    os.replace(temporary, os.path.join(root, CURRENT_FILE))
+
+
+def published_version(root: str) -> int:
+    """Version recorded by publish, or the latest snapshot when none has been published"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as file:
+            return int(file.read())
+    except FileNotFoundError:
+        versions = snapshot_versions(root)
+        if not versions:
+            raise FileNotFoundError(f"No snapshots in {root}")
+        return versions[-1]
+
+
+class Snapshot:
+    """A loaded snapshot. Arrays are memory mapped read only, so they cost no memory until
+    read and pages are shared with every other process mapping the same files. Two versions held
+    during a swap only cost the pages read from each, but a warmed version has read all of its
+    pages, so a warmed swap briefly holds both versions resident"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.version = int(os.path.basename(path)[len(SNAPSHOT_PREFIX) :])
+        with open(os.path.join(path, METADATA_FILE)) as file:
+            description = json.load(file)
+        self.metadata: dict[str, Any] = description["metadata"]
+        self.created = description["created"]
+        self.arrays: dict[str, np.ndarray] = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+            for name in description["arrays"]
+        }
+        self._in_flight = 0
+        self._drained = threading.Condition()
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __repr__(self) -> str:
+        return f"Snapshot(version={self.version}, arrays={sorted(self.arrays)})"
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _enter(self) -> None:
+        with self._drained:
+            self._in_flight += 1
+
+    def _exit(self) -> None:
+        with self._drained:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._drained.notify_all()
+
+    def wait_drained(self, timeout: float = None) -> bool:
+        """Wait until no request is using the snapshot, False if the timeout passed first"""
+        with self._drained:
+            return self._drained.wait_for(lambda: not self._in_flight, timeout)
+
+    def warm(self) -> "Snapshot":
+        """Read every page once so the first requests after a swap are not slowed by page faults"""
+        for array in self.arrays.values():
+            if array.size:
+                np.asarray(array).reshape(-1)[:: max(1, 4096 // array.itemsize)].sum()
+        return self
+
+
+class SnapshotServer:
+    """Serves requests from the current snapshot while new versions load in the background.
+    A swap replaces one reference under a lock, so queries never pause; requests already running
+    finish on the version they started with. Recently served versions stay loaded, which makes a
+    rollback another swap; older ones are released on a thread of their own once their requests
+    drain, or left to be freed by the last request using them after release_timeout seconds.
+    warm reads every page of a version before it is swapped in, at the cost of holding all of it
+    resident next to the version being served"""
+
+    def __init__(self, root: str, keep_versions: int = 2, warm: bool = True, release_timeout: float = 30.0) -> None:
+        self.root = root
+        self.keep_versions = keep_versions
+        self.warm = warm
+        self.release_timeout = release_timeout
+        self._lock = threading.Lock()
+        self._history: list[Snapshot] = []
+        self._loader = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Releases wait on requests, so they never hold up a load
+        self._releaser = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._swap_in(self._load(published_version(root)))
+
+    def _load(self, version: int) -> Snapshot:
+        snapshot = Snapshot(snapshot_path(self.root, version))
+        return snapshot.warm() if self.warm else snapshot
+
+    @property
+    def current(self) -> Snapshot:
+        return self._history[-1]
+
+    @property
+    def loaded_versions(self) -> list[int]:
+        return [snapshot.version for snapshot in self._history]
+
+    @contextlib.contextmanager
+    def request(self) -> Iterator[Snapshot]:
+        """The snapshot to answer one request from, kept loaded until the request finishes"""
+        with self._lock:
+            snapshot = self._history[-1]
+            snapshot._enter()
+        try:
+            yield snapshot
+        finally:
+            snapshot._exit()
+
+    def _swap_in(self, snapshot: Snapshot) -> Snapshot:
+        with self._lock:
+            self._history = [loaded for loaded in self._history if loaded is not snapshot] + [snapshot]
+            retired, self._history = self._history[: -self.keep_versions], self._history[-self.keep_versions :]
+        for old in retired:
+            self._releaser.submit(self._release, old)
+        return snapshot
+
+    def _release(self, snapshot: Snapshot) -> None:
+        # A request still running after the timeout keeps the arrays until it drops the snapshot
+        if snapshot.wait_drained(self.release_timeout):
+            snapshot.arrays = {}
+
+    def load(self, version: int = None) -> concurrent.futures.Future:
+        """Load a version, by default the published one, in the background and swap it in once
+        mapped. The future gives the snapshot now being served"""
+        version = published_version(self.root) if version is None else version
+        return self._loader.submit(lambda: self._swap_in(self._load(version)))
+
+    def rollback(self) -> Snapshot:
+        """Serve the previously served version again, at once as it is still loaded"""
+        with self._lock:
+            if len(self._history) < 2:
+                raise RuntimeError("No earlier version is loaded to roll back to")
+            self._history = [*self._history[:-2], self._history[-1], self._history[-2]]
+            return self._history[-1]
+
+    def close(self) -> None:
+        self._loader.shutdown(wait=True)
+        self._releaser.shutdown(wait=True)
+
+    def __enter__(self) -> "SnapshotServer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from collaborative_filtering import UserKNN
+
+    rng = np.random.default_rng(10)
+    df_reviews = pd.DataFrame(
+        {
+            "userId": rng.integers(0, 2000, 100_000),
+            "movieId": rng.integers(0, 1000, 100_000),
+            "rating": rng.integers(1, 11, 100_000) / 2,
+        }
+    )
+
+    def knn_artefacts(knn: UserKNN) -> dict[str, np.ndarray]:
+        return {
+            "user_ids": np.asarray(knn.matrix.user_ids),
+            "movie_ids": np.asarray(knn.matrix.movie_ids),
+            "neighbours": knn.neighbours,
+            "similarities": knn.similarities,
+            "user_means": knn.user_means,
+        }
+
+    with tempfile.TemporaryDirectory() as root:
+        first = save_snapshot(root, knn_artefacts(UserKNN(k=10).fit(df_reviews)), {"k": 10})
+        publish(root, first)
+        second = save_snapshot(root, knn_artefacts(UserKNN(k=20).fit(df_reviews)), {"k": 20})
+        assert (first, second) == (1, 2) and snapshot_versions(root) == [1, 2]
+        assert not any(name.startswith(".staging") for name in os.listdir(root))
+
+        with SnapshotServer(root) as server:
+            assert server.current.version == 1
+            assert isinstance(server.current["neighbours"], np.memmap)
+            assert server.current["neighbours"].shape == (2000, 10)
+
+            # A request running during the swap finishes on its version
+            with server.request() as snapshot:
+                swapped = server.load(second).result()
+                assert swapped.version == 2 and server.current.version == 2
+                assert snapshot.version == 1 and snapshot.metadata == {"k": 10}
+                assert snapshot["neighbours"].shape == (2000, 10)
+            assert server.loaded_versions == [1, 2]
+
+            # Queries keep being answered while a version loads
+            stop = threading.Event()
+            answered = []
+
+            def query():
+                while not stop.is_set():
+                    with server.request() as snapshot:
+                        answered.append(snapshot.version)
+                        assert snapshot["similarities"][0, 0] >= snapshot["similarities"][0, -1]
+
+            querying = threading.Thread(target=query)
+            querying.start()
+            publish(root, first)
+            server.load().result()
+            time.sleep(0.05)
+            stop.set()
+            querying.join()
+            assert server.current.version == 1 and {1, 2} >= set(answered)
+
+            assert server.rollback().version == 2
+            assert server.rollback().version == 1
+
+            # Retired versions are released once their requests drain
+            version_2 = server._history[0]
+            third = save_snapshot(root, {"neighbours": np.zeros((3, 2), dtype=np.int32)})
+            server.load(third).result()
+            server.close()
+            assert server.loaded_versions == [1, 3] and version_2.arrays == {}
+
+        # A request stuck on a retired version holds up neither later loads nor close
+        with SnapshotServer(root, keep_versions=1, release_timeout=0.2) as server:
+            with server.request() as stuck:
+                start = time.perf_counter()
+                server.load(second).result(timeout=5)
+                server.load(third).result(timeout=5)
+                assert time.perf_counter() - start < 0.2
+                server.close()
+                assert server.loaded_versions == [3] and stuck.arrays
+
+        # Snapshots are read only
+        mode = os.stat(os.path.join(snapshot_path(root, 1), "neighbours.npy")).st_mode
+        assert not mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
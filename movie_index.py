@@ -0,0 +1,213 @@
+import bisect
+import collections
+import numpy as np
+import pandas as pd
+import re
+import unicodedata
+from typing import Optional
+
+# Year in parentheses at the end of a title, as in "Avatar (2009)"
+TITLE_YEAR = re.compile(r"\s*\((\d\d\d\d)\)\s*$")
+# Leading article moved to the end by the data source, as in "Matrix, The"
+TRAILING_ARTICLE = re.compile(r"^(.*), (the|a|an)$")
+
+
+def split_title_year(title: str) -> tuple[str, Optional[int]]:
+    """Split a title with a year in parentheses into the title and year"""
+    match = TITLE_YEAR.search(title)
+    if match:
+        return title[: match.start()], int(match.group(1))
+    return title, None
+
+
+def normalise_title(title: str) -> str:
+    """Lower case title without accents, punctuation or repeated spaces and with any
+    trailing article put back in front, so small differences in format still match"""
+    title = unicodedata.normalize("NFKD", str(title))
+    title = "".join(char for char in title if not unicodedata.combining(char)).lower().strip()
+    article = TRAILING_ARTICLE.match(title)
+    if article:
+        title = f"{article.group(2)} {article.group(1)}"
+    title = re.sub(r"[^\w\s]", " ", title)
+    return " ".join(title.split())
+
+
+def trigrams(text: str) -> set[str]:
+    """Three letter pieces of the padded text, used to find titles spelt slightly differently"""
+    padded = f"  {text} "
+    return {padded[start : start + 3] for start in range(len(padded) - 2)}
+
+
+class MovieIndex:
+    """Lookup of movies by title and year built once from the movie table, so resolving a
+    seed movie is a hash lookup rather than a scan. Titles are matched once normalised, a
+    trigram index suggests close titles and a sorted title list answers prefix searches"""
+
+    def __init__(self, movies_df: pd.DataFrame) -> None:
+        self._movie_ids = movies_df["movieId"].to_numpy()
+        self._titles = movies_df["title"].astype(str).tolist()
+        if "year" in movies_df:
+            # extract_year leaves floats such as 2009.0 where some titles have no year
+            numeric_years = pd.to_numeric(movies_df["year"], errors="coerce")
+            years = [None if pd.isna(year) else int(year) for year in numeric_years]
+            names = self._titles
+        else:
+            names, years = zip(*map(split_title_year, self._titles)) if self._titles else ((), ())
+        self._years = list(years)
+        self._names = [normalise_title(name) for name in names]
+
+        self._by_title_year: dict[tuple[str, Optional[int]], list[int]] = collections.defaultdict(list)
+        self._by_title: dict[str, list[int]] = collections.defaultdict(list)
+        trigram_positions = collections.defaultdict(list)
+        for position, (name, year) in enumerate(zip(self._names, self._years)):
+            self._by_title_year[name, year].append(position)
+            self._by_title[name].append(position)
+            for trigram in trigrams(name):
+                trigram_positions[trigram].append(position)
+        self._trigrams = {
+            trigram: np.array(positions, dtype=np.int64)
+            for trigram, positions in trigram_positions.items()
+        }
+        self._trigram_counts = np.array([len(trigrams(name)) for name in self._names])
+        self._sorted_names = sorted(
+            (name, position) for position, name in enumerate(self._names)
+        )
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _describe(self, position: int) -> dict:
+        return {
+            "movieId": self._movie_ids[position].item(),
+            "title": self._titles[position],
+            "year": self._years[position],
+        }
+
+    def lookup(self, title: str, year: int = None) -> list[int]:
+        """movieIds of the movies with the title, and year when given (or written in the title)"""
+        if year is None:
+            title, year = split_title_year(title)
+        name = normalise_title(title)
+        positions = self._by_title.get(name, []) if year is None else self._by_title_year.get((name, int(year)), [])
+        return [self._movie_ids[position].item() for position in positions]
+
+    def suggest(self, title: str, limit: int = 5) -> list[dict]:
+        """Movies whose titles share the most trigrams with the title, best first, for a "did you mean" """
+        name = normalise_title(split_title_year(title)[0])
+        wanted = trigrams(name)
+        found = [self._trigrams[trigram] for trigram in wanted if trigram in self._trigrams]
+        if not found:
+            return []
+        shared = np.bincount(np.concatenate(found), minlength=len(self._names))
+        candidates = np.flatnonzero(shared)
+        scores = shared[candidates] / (
+            len(wanted) + self._trigram_counts[candidates] - shared[candidates]
+        )
+        best = np.argsort(-scores, kind="stable")[:limit]
+        return [
+            {**self._describe(candidates[rank]), "score": scores[rank].item()}
+            for rank in best
+        ]
+
+    def starting_with(self, prefix: str, limit: int = 10) -> list[dict]:
+        """Movies whose normalised titles start with the prefix, in title order"""
+        prefix = normalise_title(prefix)
+        start = bisect.bisect_left(self._sorted_names, (prefix, -1))
+        matches = []
+        for name, position in self._sorted_names[start : start + limit]:
+            if not name.startswith(prefix):
+                break
+            matches.append(self._describe(position))
+        return matches
+
+
+class RatingIndex:
+    """Rating of a movie by a user found by binary search of the sorted (userId, movieId) keys,
+    so a single rating never needs a scan of the ratings"""
+
+    def __init__(self, ratings_df: pd.DataFrame) -> None:
+        keys = self._keys(ratings_df["userId"].to_numpy(), ratings_df["movieId"].to_numpy())
+        order = np.argsort(keys, kind="stable")
+        self._keys_sorted = keys[order]
+        self._ratings = ratings_df["rating"].to_numpy(dtype=float)[order]
+
+    @staticmethod
+    def _keys(user_ids: np.ndarray, movie_ids: np.ndarray) -> np.ndarray:
+        return (np.asarray(user_ids, dtype=np.int64) << 32) | np.asarray(movie_ids, dtype=np.int64)
+
+    def ratings(self, user_ids, movie_ids) -> np.ndarray:
+        """Ratings for each user and movie pair, nan where the user has not rated the movie.
+        Where a user rated a movie more than once the latest rating loaded is given"""
+        keys = self._keys(np.atleast_1d(user_ids), np.atleast_1d(movie_ids))
+        positions = np.searchsorted(self._keys_sorted, keys, side="right") - 1
+        found = (positions >= 0) & (self._keys_sorted[np.maximum(positions, 0)] == keys)
+        return np.where(found, self._ratings[np.maximum(positions, 0)], np.nan)
+
+    def rating(self, user_id: int, movie_id: int) -> Optional[float]:
+        """Rating the user gave the movie, None when they have not rated it"""
+        value = self.ratings(user_id, movie_id)[0]
+        return None if np.isnan(value) else value.item()
+
+
+if __name__ == "__main__":
+    import time
+
+    df_movie_titles = pd.DataFrame(
+        {
+            "movieId": [1, 2, 3, 72998, 4, 5],
+            "title": [
+                "Toy Story (1995)",
+                "Jumanji (1995)",
+                "Matrix, The (1999)",
+                "Avatar (2009)",
+                "Amélie (Fabuleux destin d'Amélie Poulain, Le) (2001)",
+                "Avatar",
+            ],
+        }
+    )
+    movie_index = MovieIndex(df_movie_titles)
+
+    # Exact matches once the format differences are normalised away
+    assert movie_index.lookup("Avatar (2009)") == [72998]
+    assert movie_index.lookup("avatar", 2009) == [72998]
+    assert movie_index.lookup("Avatar") == [72998, 5]
+    assert movie_index.lookup("The Matrix (1999)") == [3]
+    assert movie_index.lookup("Avatar (2010)") == []
+    # Titles that miss are not added to the index
+    titles = len(movie_index._by_title)
+    assert movie_index.lookup("Not a movie") == [] and len(movie_index._by_title) == titles
+
+    # Years already split out by extract_year, floats where some titles have none
+    df_split_years = pd.DataFrame(
+        {"movieId": [72998, 5], "title": ["Avatar", "Avatar"], "year": [2009.0, ""]}
+    )
+    split_index = MovieIndex(df_split_years)
+    assert split_index.lookup("Avatar", 2009) == [72998]
+    assert split_index.lookup("Avatar") == [72998, 5]
+
+    # Did you mean
+    suggestions = movie_index.suggest("Avatr")
+    print(suggestions)
+    assert suggestions[0]["movieId"] in (72998, 5)
+    assert movie_index.suggest("Amelie")[0]["movieId"] == 4
+    assert [movie["movieId"] for movie in movie_index.starting_with("the ma")] == [3]
+
+    df_reviews = pd.DataFrame(
+        {
+            "userId": [21, 21, 5000000, 7],
+            "movieId": [72998, 1, 3, 72998],
+            "rating": [4.5, 3.0, 4.0, 2.0],
+        }
+    )
+    rating_index = RatingIndex(df_reviews)
+    assert rating_index.rating(21, 72998) == 4.5
+    assert rating_index.rating(21, 3) is None
+    assert np.allclose(
+        rating_index.ratings([7, 5000000, 1], [72998, 3, 1]), [2.0, 4.0, np.nan], equal_nan=True
+    )
+
+    # A seed is resolved in microseconds whatever the size of the ratings
+    start = time.perf_counter()
+    for _ in range(10000):
+        rating_index.rating(21, movie_index.lookup("Avatar (2009)")[0])
+    print(f"Seed lookup took {(time.perf_counter() - start) / 10000 * 1e6:.1f} microseconds")
@@ -0,0 +1,338 @@
+import argparse
+import concurrent.futures
+import hashlib
+import importlib
+import inspect
+import numpy as np
+import os
+import pandas as pd
+import time
+from collaborative_filtering import UserKNN
+from data_factory import CSV_DataFrame_Stream, LoadCache
+from movie_index import split_title_year
+from typing import Any, Callable
+
+# Defining additional NaN identifiers.
+MISSING_VALUES = ["na", "--", "?", "-", "None", "none", "non"]
+
+
+def ingest(inputs: dict, reviews: str, movies: str) -> dict:
+    """Parse the reviews and movie titles csv files"""
+    stream = CSV_DataFrame_Stream()
+    return {
+        "reviews": stream.load_data(reviews, missing_values=MISSING_VALUES),
+        "movies": stream.load_data(movies, missing_values=MISSING_VALUES),
+    }
+
+
+def clean(inputs: dict) -> dict:
+    """Drop reviews without a rating, keep the latest rating of a movie by a user, and split the
+    year out of the titles and the genres into lists"""
+    df_reviews = inputs["ingest"]["reviews"].dropna(subset=["userId", "movieId", "rating"])
+    df_reviews = df_reviews.drop_duplicates(["userId", "movieId"], keep="last").reset_index(drop=True)
+    df_movie_titles = inputs["ingest"]["movies"].copy()
+    titles, years = zip(*map(split_title_year, df_movie_titles["title"].astype(str))) if len(df_movie_titles) else ((), ())
+    df_movie_titles["title"] = [title.strip() for title in titles]
+    df_movie_titles["year"] = pd.array(years, dtype="Int16")
+    df_movie_titles["genres"] = df_movie_titles["genres"].str.split("|")
+    return {"reviews": df_reviews, "movies": df_movie_titles}
+
+
+def aggregate(inputs: dict) -> pd.DataFrame:
+    """Average rating and number of ratings of each movie, with its title and year"""
+    grouped = inputs["clean"]["reviews"].groupby("movieId")["rating"]
+    df_ratings = pd.DataFrame({"rating": grouped.mean(), "number_of_ratings": grouped.count()})
+    df_movie_titles = inputs["clean"]["movies"].set_index("movieId")[["title", "year"]]
+    return df_ratings.join(df_movie_titles).reset_index()
+
+
+def similarity(inputs: dict, k: int, block_size: int) -> UserKNN:
+    """Neighbour graph of the users"""
+    return UserKNN(k=k, block_size=block_size).fit(inputs["clean"]["reviews"])
+
+
+def recommend(inputs: dict, top_n: int, min_ratings: int, users: list = None) -> pd.DataFrame:
+    """The top_n movies for each user, or those given, from movies with at least min_ratings ratings"""
+    knn: UserKNN = inputs["similarity"]
+    df_ratings = inputs["aggregate"].set_index("movieId")
+    popular = df_ratings.index[df_ratings["number_of_ratings"] >= min_ratings]
+    allowed = np.isin(knn.matrix.movie_ids, popular)
+    frames = []
+    for user_id in knn.matrix.user_ids if users is None else users:
+        recommended = knn.recommend(user_id, n=len(knn.matrix.movie_ids))
+        recommended = recommended[allowed[np.searchsorted(knn.matrix.movie_ids, recommended["movieId"])]].head(top_n)
+        frames.append(recommended.assign(userId=user_id, rank=np.arange(1, len(recommended) + 1)))
+    df_recommended = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["movieId", "score", "userId", "rank"])
+    df_recommended = df_recommended.join(df_ratings[["title", "year"]], on="movieId")
+    return df_recommended[["userId", "rank", "movieId", "title", "year", "score"]]
+
+
+def export(inputs: dict, output_dir: str) -> list[str]:
+    """Write the recommendations and movie ratings as csv files"""
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    for name, df_data in (("recommendations", inputs["recommend"]), ("movie_ratings", inputs["aggregate"])):
+        files.append(os.path.join(output_dir, f"{name}.csv"))
+        df_data.to_csv(files[-1], index=None)
+    return files
+
+
+class Stage:
+    """A step of the pipeline: the function, the stages whose outputs it takes, its parameters
+    and the parameters naming input files. A checkpointed stage's output is saved under a key of
+    its code, parameters, input files and the keys of the stages before it, so it only reruns
+    when one of those changes. The code is the stage function and the source of the modules in
+    modules, the code it calls; version can be bumped for changes the source does not show,
+    such as to an installed library"""
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable,
+        inputs: list[str] = (),
+        params: dict = None,
+        files: list[str] = (),
+        checkpoint: bool = True,
+        modules: list[str] = (),
+        version: str = "1",
+    ) -> None:
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.files = list(files)
+        self.checkpoint = checkpoint
+        self.modules = list(modules)
+        self.version = version
+
+    def code_hash(self) -> str:
+        """Hash of the stage function, the modules it depends on and its version"""
+        digest = hashlib.sha256(self.version.encode())
+        for code in [self.run, *map(importlib.import_module, self.modules)]:
+            digest.update(inspect.getsource(code).encode())
+        return digest.hexdigest()
+
+
+def _run_stage(stage: Stage, key: str, input_keys: dict[str, str], checkpoint_dir: str) -> str:
+    """Run a stage in a worker process, reading its inputs from and writing its output to the
+    checkpoints, so only keys cross between processes. Returns the key of the checkpoint"""
+    checkpoints = LoadCache(max_entries=len(input_keys) + 1, cache_dir=checkpoint_dir)
+    inputs = {name: checkpoints.get(input_key) for name, input_key in input_keys.items()}
+    output = stage.run(inputs, **stage.params)
+    if stage.checkpoint:
+        checkpoints.put(key, output)
+    return key
+
+
+class Pipeline:
+    """Stages run in dependency order, those whose inputs are ready running in parallel processes.
+    A stage whose checkpoint exists is skipped without loading it, so after a failure a rerun
+    resumes from the last completed stages"""
+
+    def __init__(self, stages: list[Stage], checkpoint_dir: str, max_workers: int = None) -> None:
+        self.stages = {stage.name: stage for stage in stages}
+        self.checkpoint_dir = checkpoint_dir
+        self.max_workers = max_workers
+        self.checkpoints = LoadCache(max_entries=0, cache_dir=checkpoint_dir)
+        self.keys = self._keys()
+
+    def _keys(self) -> dict[str, str]:
+        keys = {}
+        for name, stage in self.stages.items():
+            identity = (
+                name,
+                stage.code_hash(),
+                sorted((param, repr(value)) for param, value in stage.params.items()),
+                sorted(self.checkpoints.key(stage.params[param], name) for param in stage.files),
+                [keys[input_name] for input_name in stage.inputs],
+            )
+            keys[name] = hashlib.sha256(repr(identity).encode()).hexdigest()
+        return keys
+
+    def _to_run(self, targets: list[str], force: set[str]) -> set[str]:
+        """Stages that must run to produce the targets: those without a checkpoint, and the stages
+        before them that have none either"""
+        to_run = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            stage = self.stages[name]
+            if name in to_run or (stage.checkpoint and name not in force and self.keys[name] in self.checkpoints):
+                continue
+            to_run.add(name)
+            pending.extend(stage.inputs)
+        return to_run
+
+    def run(self, until: str = None, force: set[str] = frozenset()) -> dict[str, str]:
+        """Run the stages up to and including until, by default all of them, returning how each
+        stage was completed: "cached", "ran" or "skipped" when not needed"""
+        targets = [until] if until else list(self.stages)
+        to_run = self._to_run(targets, set(force))
+        status = {name: "skipped" for name in self.stages}
+        status.update({name: "cached" for name in self._needed(targets) - to_run})
+        done: set[str] = set()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            running: dict[concurrent.futures.Future, str] = {}
+            while to_run - done:
+                for name in sorted(to_run - done - set(running.values())):
+                    if all(input_name in done or input_name not in to_run for input_name in self.stages[name].inputs):
+                        stage = self.stages[name]
+                        input_keys = {input_name: self.keys[input_name] for input_name in stage.inputs}
+                        future = executor.submit(_run_stage, stage, self.keys[name], input_keys, self.checkpoint_dir)
+                        running[future] = name
+                finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # Raises the stage's error, leaving the completed stages checkpointed
+                    future.result()
+                    done.add(name)
+                    status[name] = "ran"
+        return status
+
+    def _needed(self, targets: list[str]) -> set[str]:
+        needed, pending = set(), list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+        return needed
+
+    def output(self, name: str) -> Any:
+        """Output of a checkpointed stage, loaded from its checkpoint"""
+        if not self.stages[name].checkpoint:
+            raise ValueError(f"Stage {name} is not checkpointed")
+        return self.checkpoints.get(self.keys[name])
+
+
+def build_pipeline(args: argparse.Namespace) -> Pipeline:
+    stages = [
+        Stage(
+            "ingest",
+            ingest,
+            params={"reviews": args.reviews, "movies": args.movies},
+            files=["reviews", "movies"],
+            modules=["data_factory"],
+        ),
+        Stage("clean", clean, ["ingest"], modules=["movie_index"]),
+        Stage("aggregate", aggregate, ["clean"]),
+        Stage(
+            "similarity",
+            similarity,
+            ["clean"],
+            {"k": args.k, "block_size": args.block_size},
+            modules=["collaborative_filtering"],
+        ),
+        Stage(
+            "recommend",
+            recommend,
+            ["similarity", "aggregate"],
+            {"top_n": args.top_n, "min_ratings": args.min_ratings, "users": args.users},
+            modules=["collaborative_filtering"],
+        ),
+        Stage("export", export, ["recommend", "aggregate"], {"output_dir": args.output_dir}, checkpoint=False),
+    ]
+    return Pipeline(stages, args.checkpoint_dir, args.workers)
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build movie recommendations: ingest, clean, aggregate, similarity, recommend, export. "
+        "Completed stages are checkpointed and skipped when rerun with the same inputs and parameters."
+    )
+    parser.add_argument("--reviews", default="reviews.csv", help="reviews csv: userId, movieId, rating, timestamp")
+    parser.add_argument("--movies", default="movies.csv", help="movies csv: movieId, title, genres")
+    parser.add_argument("--checkpoint-dir", default=".pipeline", help="where stage outputs are checkpointed")
+    parser.add_argument("--output-dir", default="export", help="where the csv files are exported")
+    parser.add_argument("--k", type=int, default=20, help="neighbours kept for each user")
+    parser.add_argument("--block-size", type=int, default=1024, help="users per block of the neighbour build")
+    parser.add_argument("--top-n", type=int, default=10, help="recommendations for each user")
+    parser.add_argument("--min-ratings", type=int, default=1, help="ratings a movie needs to be recommended")
+    parser.add_argument("--users", type=int, nargs="*", help="only recommend for these userIds")
+    parser.add_argument("--until", help="last stage to run")
+    parser.add_argument("--force", nargs="*", default=[], help="stages to rerun even if checkpointed")
+    parser.add_argument("--workers", type=int, help="processes running independent stages")
+    parser.add_argument("--self-test", action="store_true", help="check the pipeline on generated data and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> Pipeline:
+    args = parse_args(argv)
+    if args.self_test:
+        self_test()
+        return None
+    pipeline = build_pipeline(args)
+    start = time.perf_counter()
+    status = pipeline.run(until=args.until, force=set(args.force))
+    for name, how in status.items():
+        print(f"{name:<12}{how}")
+    print(f"Finished in {time.perf_counter() - start:.2f} seconds")
+    return pipeline
+
+
+def self_test() -> None:
+    """Run the pipeline on generated data and check reruns are resumed"""
+    import tempfile
+
+    rng = np.random.default_rng(10)
+    with tempfile.TemporaryDirectory() as work_dir:
+        reviews_csv = os.path.join(work_dir, "reviews.csv")
+        movies_csv = os.path.join(work_dir, "movies.csv")
+        pd.DataFrame(
+            {
+                "userId": rng.integers(0, 500, 20_000),
+                "movieId": rng.integers(0, 300, 20_000),
+                "rating": rng.integers(1, 11, 20_000) / 2,
+                "timestamp": rng.integers(964981247, 1262390400, 20_000),
+            }
+        ).to_csv(reviews_csv, index=None)
+        pd.DataFrame(
+            {
+                "movieId": np.arange(300),
+                "title": [f"Movie {index} ({1950 + index % 70})" for index in range(300)],
+                "genres": ["Comedy|Romance"] * 300,
+            }
+        ).to_csv(movies_csv, index=None)
+        argv = [
+            "--reviews", reviews_csv,
+            "--movies", movies_csv,
+            "--checkpoint-dir", os.path.join(work_dir, "checkpoints"),
+            "--output-dir", os.path.join(work_dir, "export"),
+            "--users", "1", "2", "3",
+            "--workers", "2",
+        ]
+
+        pipeline = main(argv + ["--until", "aggregate"])
+        assert pipeline.run(until="aggregate") == {
+            "ingest": "cached", "clean": "cached", "aggregate": "cached",
+            "similarity": "skipped", "recommend": "skipped", "export": "skipped",
+        }
+
+        # Only the stages after the last checkpoint run, aggregate is reused
+        pipeline = main(argv)
+        recommendations = pd.read_csv(os.path.join(work_dir, "export", "recommendations.csv"))
+        assert set(recommendations["userId"]) == {1, 2, 3}
+        assert recommendations.groupby("userId")["rank"].max().max() == 10
+
+        # A parameter change reruns its stage and those after it only
+        status = main(argv + ["--top-n", "5"]).run()
+        assert status["similarity"] == "cached" and status["recommend"] == "cached" and status["export"] == "ran"
+        status = build_pipeline(parse_args(argv + ["--top-n", "5"])).run(force={"clean"})
+        assert status["ingest"] == "cached" and status["clean"] == "ran"
+
+        # Bumping the version of a stage, as for a change in the code it calls, reruns it and those after it
+        pipeline = build_pipeline(parse_args(argv))
+        pipeline.stages["similarity"].version = "2"
+        pipeline.keys = pipeline._keys()
+        assert pipeline._to_run(list(pipeline.stages), set()) == {"similarity", "recommend", "export"}
+        assert pipeline.output("aggregate") is not None
+
+        # A changed input file invalidates every stage after ingest
+        time.sleep(0.01)
+        os.utime(reviews_csv)
+        pipeline = build_pipeline(parse_args(argv))
+        assert pipeline._to_run(list(pipeline.stages), set()) == set(pipeline.stages)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import hashlib
+import numpy as np
 from typing import Generator
 
 
 class RepeatableRandom:
     def __init__(self, seed: str) -> None:
         hash = str.encode(seed)
+        self._seed = hash
         self._forever = False
         self._hash = hashlib.md5(hash).digest()
         self._iterable = iter(self)
@@ -30,6 +32,36 @@ class RepeatableRandom:
         self._forever = forever
         return self
 
+    def _digest_bytes(self, first: int, last: int) -> np.ndarray:
+        """Bytes of the digests numbered first up to last. Digest 0 is the digest of the seed, as used
+        by the generator, the others the digest of the seed followed by their number (counter mode)"""
+        digests = [
+            hashlib.md5(self._seed + block.to_bytes(8, "little")).digest()
+            if block
+            else self._hash
+            for block in range(first, last)
+        ]
+        return np.frombuffer(b"".join(digests), dtype=np.uint8)
+
+    def random_array(self, size: int, min: float, max: float) -> np.ndarray:
+        """size repeatable values between min and max as an array. The first values are the same
+        as the generator gives with forever=False, the stream then carries on with new digests
+        rather than repeating the same 16 bytes"""
+        if size <= 0:
+            return np.empty(0, dtype=np.float64)
+        chunks = []
+        found = 0
+        blocks = 0
+        while found < size:
+            # Bytes above 250 are skipped so allow for a few more blocks than an exact fit
+            more = (size - found) * 256 // (16 * 250) + 1
+            codes = self._digest_bytes(blocks, blocks + more)
+            blocks += more
+            values = min + (max - min) * (codes / 250)
+            chunks.append(values[values <= max])
+            found += len(chunks[-1])
+        return np.concatenate(chunks)[:size]
+
 
 rr = RepeatableRandom("The quick brown fox jumps over a lazy dog.")
 
@@ -108,3 +140,15 @@ if __name__ == "__main__":
     ]
     for indx, each in enumerate(rr.repeatable_random(4, 9, forever=False)):
         assert each == expected[indx]
+
+    # The bulk values start with the generator values and carry on with new values
+    rr = RepeatableRandom("Sphinx of black quartz, judge my vow.")
+    values = rr.random_array(1_000_000, 4, 9)
+    assert values.tolist()[:16] == expected
+    assert len(values) == 1_000_000 and values.min() >= 4 and values.max() <= 9
+    assert values[16:32].tolist() != expected
+    assert np.array_equal(
+        RepeatableRandom("Sphinx of black quartz, judge my vow.").random_array(1000, 4, 9),
+        values[:1000],
+    )
+    assert rr.random_array(0, 4, 9).shape == (0,)
@@ -0,0 +1,161 @@
+import concurrent.futures
+import matplotlib
+from matplotlib.figure import Figure
+import numpy as np
+import os
+import pandas as pd
+from typing import Callable
+
+# Above this many points a scatter is drawn as a hexbin density instead
+SCATTER_POINT_LIMIT = 10_000
+
+
+def rating_distribution(df_reviews: pd.DataFrame) -> pd.Series:
+    """Number of ratings given for each rating value"""
+    return df_reviews["rating"].value_counts().sort_index()
+
+
+def movie_ratings(df_reviews: pd.DataFrame) -> pd.DataFrame:
+    """Average rating and number of ratings of each movie"""
+    grouped = df_reviews.groupby("movieId")["rating"]
+    return pd.DataFrame({"rating": grouped.mean(), "number_of_ratings": grouped.count()})
+
+
+def ratings_by_year(df_reviews: pd.DataFrame, df_movie_titles: pd.DataFrame) -> pd.Series:
+    """Number of ratings of the movies released in each year, for the movies with a year"""
+    years = df_movie_titles["title"].astype(str).str.extract(r"\((\d\d\d\d)\)\s*$")[0]
+    years = pd.to_numeric(years, errors="coerce")
+    years.index = df_movie_titles["movieId"]
+    counts = df_reviews["movieId"].map(years).dropna().astype(int).value_counts()
+    return counts.sort_index()
+
+
+def histogram(values: pd.Series, bins: int = 50) -> tuple[np.ndarray, np.ndarray]:
+    """Counts and bin edges of the values, so only the bins need to be drawn"""
+    return np.histogram(values.to_numpy(dtype=float), bins=bins)
+
+
+def report_aggregates(df_reviews: pd.DataFrame, df_movie_titles: pd.DataFrame = None) -> dict:
+    """Pre-binned data for each chart in the report, small whatever the size of the reviews"""
+    df_ratings = movie_ratings(df_reviews)
+    aggregates = {
+        "rating_distribution": rating_distribution(df_reviews),
+        "ratings_per_movie": histogram(df_ratings["number_of_ratings"]),
+        "average_rating": histogram(df_ratings["rating"]),
+        "rating_vs_count": df_ratings,
+    }
+    if df_movie_titles is not None:
+        aggregates["ratings_by_year"] = ratings_by_year(df_reviews, df_movie_titles)
+    return aggregates
+
+
+def _draw_bars(axes, counts: pd.Series, xlabel: str, ylabel: str) -> None:
+    axes.bar(counts.index.to_numpy(), counts.to_numpy(), width=0.4)
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+
+
+def _draw_histogram(axes, binned: tuple[np.ndarray, np.ndarray], xlabel: str, ylabel: str) -> None:
+    counts, edges = binned
+    axes.stairs(counts, edges, fill=True, edgecolor="black")
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+
+
+def _draw_rating_vs_count(axes, df_ratings: pd.DataFrame) -> None:
+    if len(df_ratings) > SCATTER_POINT_LIMIT:
+        image = axes.hexbin(
+            df_ratings["rating"], df_ratings["number_of_ratings"], gridsize=60, bins="log", yscale="log"
+        )
+        axes.figure.colorbar(image, ax=axes, label="# of movies")
+    else:
+        axes.scatter(df_ratings["rating"], df_ratings["number_of_ratings"], s=8)
+    axes.set_xlabel("Rating value")
+    axes.set_ylabel("# of ratings")
+
+
+CHARTS: dict[str, Callable] = {
+    "rating_distribution": lambda axes, data: _draw_bars(axes, data, "rating", "# of ratings"),
+    "ratings_per_movie": lambda axes, data: _draw_histogram(axes, data, "# of ratings", "# of movies"),
+    "average_rating": lambda axes, data: _draw_histogram(axes, data, "Rating value", "# of movies"),
+    "rating_vs_count": _draw_rating_vs_count,
+    "ratings_by_year": lambda axes, data: _draw_bars(axes, data, "Year", "# of ratings"),
+}
+
+
+def render_chart(name: str, data, output_dir: str, fmt: str = "png") -> str:
+    """Draw one chart from its aggregate and save it, returning the file written.
+    A Figure is used directly rather than pyplot so no window, backend or global state is involved"""
+    figure = Figure(figsize=(8, 6))
+    axes = figure.add_subplot()
+    CHARTS[name](axes, data)
+    axes.set_title(name.replace("_", " ").capitalize())
+    path = os.path.join(output_dir, f"{name}.{fmt}")
+    figure.savefig(path, format=fmt)
+    return path
+
+
+def render_report(
+    df_reviews: pd.DataFrame,
+    df_movie_titles: pd.DataFrame = None,
+    output_dir: str = "report",
+    fmt: str = "png",
+    max_workers: int = 1,
+) -> list[str]:
+    """Aggregate the reviews once and write each chart to the output directory as png or svg.
+    With more than one worker the charts are drawn in parallel processes"""
+    os.makedirs(output_dir, exist_ok=True)
+    aggregates = report_aggregates(df_reviews, df_movie_titles)
+    if max_workers == 1:
+        return [render_chart(name, data, output_dir, fmt) for name, data in aggregates.items()]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(render_chart, name, data, output_dir, fmt)
+            for name, data in aggregates.items()
+        ]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    # Render without a display so reports can be built on batch hosts
+    matplotlib.use("Agg")
+
+    rng = np.random.default_rng(10)
+    movies = 50_000
+    df_movie_titles = pd.DataFrame(
+        {
+            "movieId": np.arange(movies),
+            "title": [f"Movie {index} ({1950 + index % 70})" for index in range(movies)],
+        }
+    )
+    df_movie_titles.loc[0, "title"] = "Movie without a year"
+    df_reviews = pd.DataFrame(
+        {
+            "userId": rng.integers(0, 20_000, 1_000_000),
+            "movieId": rng.zipf(1.3, 1_000_000) % movies,
+            "rating": rng.integers(1, 11, 1_000_000) / 2,
+        }
+    )
+
+    aggregates = report_aggregates(df_reviews, df_movie_titles)
+    assert aggregates["rating_distribution"].sum() == len(df_reviews)
+    assert aggregates["ratings_per_movie"][0].sum() == df_reviews["movieId"].nunique()
+    with_year = df_reviews["movieId"] != 0
+    assert aggregates["ratings_by_year"].sum() == with_year.sum()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        files = render_report(df_reviews, df_movie_titles, output_dir)
+        print(f"Report rendered in {time.perf_counter() - start:.2f} seconds")
+        assert len(files) == 5 and all(os.path.getsize(file) > 0 for file in files)
+
+        files = render_report(df_reviews.head(1000), None, output_dir, fmt="svg", max_workers=2)
+        assert sorted(os.path.basename(file) for file in files) == [
+            "average_rating.svg",
+            "rating_distribution.svg",
+            "rating_vs_count.svg",
+            "ratings_per_movie.svg",
+        ]
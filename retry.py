@@ -1,6 +1,15 @@
+import array
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import heapq
+import math
 import random
+import threading
 import time
-from typing import Any, Callable
+from typing import Any, Awaitable, Callable
 
 
 class Duration:
@@ -20,6 +29,164 @@ class Duration:
         """Specify number of minutes in seconds"""
         return interval_time * 60
 
+class SystemClock:
+    """Wall clock time with real sleeps"""
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    async def wait_for(self, awaitable: Awaitable, timeout: float = None) -> Any:
+        """Await, cancelling and raising asyncio.TimeoutError after timeout seconds"""
+        return await asyncio.wait_for(awaitable, timeout)
+
+    def wait(self, futures, timeout: float = None) -> tuple[set, set]:
+        """Wait for the first of the futures to finish, or for timeout seconds"""
+        return concurrent.futures.wait(futures, timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+
+
+class VirtualClock:
+    """Clock whose time only moves on when slept on or advanced, so sleeps return at once.
+    Lets backoff be tested and simulated with the same timing checks as the wall clock.
+
+    Sleeps overlap as real ones would rather than adding up. An async sleep is a wakeup registered
+    at now + seconds. The clock knows which tasks are inside sleep_async or wait_for, and once every
+    one of them is waiting on a wakeup it jumps to the earliest and wakes the tasks due then, so a
+    task awaiting anything else inside wait_for holds the clock until it comes back. Blocking sleeps
+    move the clock straight on, which is only right for one sleeper, so they may only come from one
+    thread; threads each need a clock"""
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+        self._lock = threading.Lock()
+        self._wakeups: list[tuple[float, int, asyncio.Future]] = []
+        self._sequence = 0
+        self._advance_scheduled = False
+        self._sleeping_thread = None
+        # Tasks inside the clock, and the futures each is waiting on
+        self._holders: collections.Counter = collections.Counter()
+        self._waiting: dict[asyncio.Task, list[asyncio.Future]] = {}
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        with self._lock:
+            self._now += seconds
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            if self._sleeping_thread is None:
+                self._sleeping_thread = threading.get_ident()
+            elif self._sleeping_thread != threading.get_ident():
+                raise RuntimeError("A VirtualClock can only be slept on by one thread, give each thread its own clock")
+            self._now += seconds
+
+    def wait(self, futures, timeout: float = None) -> tuple[set, set]:
+        """Wait for the first of the futures to finish. Running calls take no virtual time, so the
+        clock cannot reach the timeout before one of them finishes"""
+        return concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+    async def sleep_async(self, seconds: float) -> None:
+        loop = asyncio.get_running_loop()
+        with self._held(loop) as task:
+            wakeup = self._wakeup_at(loop, task, self._now + max(seconds, 0.0))
+            try:
+                await wakeup
+            finally:
+                self._forget_wakeup(task, wakeup)
+
+    async def wait_for(self, awaitable: Awaitable, timeout: float = None) -> Any:
+        """Await in a task of its own, cancelling it and raising asyncio.TimeoutError once the
+        clock reaches timeout seconds from now"""
+        loop = asyncio.get_running_loop()
+        with self._held(loop) as task:
+            # Held from the start, so the clock does not move on before the attempt first runs
+            attempt = asyncio.ensure_future(awaitable)
+            self._hold(attempt)
+            attempt.add_done_callback(lambda attempt: self._release(attempt, loop))
+            wakeup = None if timeout is None else self._wakeup_at(loop, task, self._now + max(timeout, 0.0))
+            if wakeup is not None:
+                # Woken by the attempt finishing as much as by the timeout
+                self._waiting[task].append(attempt)
+            timed_out = False
+            try:
+                await asyncio.wait([attempt] if wakeup is None else [attempt, wakeup], return_when=asyncio.FIRST_COMPLETED)
+                timed_out = not attempt.done()
+            finally:
+                self._forget_wakeup(task, wakeup)
+                if not attempt.done():
+                    attempt.cancel()
+                    await asyncio.wait([attempt])
+            if timed_out:
+                raise asyncio.TimeoutError()
+            return attempt.result()
+
+    def _hold(self, task: asyncio.Future) -> None:
+        """Count the task as inside the clock, so it does not move on while the task runs"""
+        self._holders[task] += 1
+
+    def _release(self, task: asyncio.Future, loop: asyncio.AbstractEventLoop) -> None:
+        self._holders[task] -= 1
+        if not self._holders[task]:
+            del self._holders[task]
+        self._schedule_advance(loop)
+
+    @contextlib.contextmanager
+    def _held(self, loop: asyncio.AbstractEventLoop):
+        task = asyncio.current_task()
+        self._hold(task)
+        try:
+            yield task
+        finally:
+            self._release(task, loop)
+
+    def _wakeup_at(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task, deadline: float) -> asyncio.Future:
+        wakeup = loop.create_future()
+        with self._lock:
+            heapq.heappush(self._wakeups, (deadline, self._sequence, wakeup))
+            self._sequence += 1
+        self._waiting[task] = [wakeup]
+        self._schedule_advance(loop)
+        return wakeup
+
+    def _forget_wakeup(self, task: asyncio.Task, wakeup: asyncio.Future) -> None:
+        if wakeup is not None:
+            if wakeup in self._waiting.get(task, ()):
+                del self._waiting[task]
+            wakeup.cancel()
+
+    def _schedule_advance(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Run after the callbacks already scheduled, so tasks just started reach the clock first
+        if not self._advance_scheduled:
+            self._advance_scheduled = True
+            loop.call_soon(self._advance_when_idle)
+
+    def _advance_when_idle(self) -> None:
+        self._advance_scheduled = False
+        # A task woken but not yet resumed, or awaiting something else, is still running
+        for task in self._holders:
+            if not task.done() and (task not in self._waiting or any(future.done() for future in self._waiting[task])):
+                return
+        with self._lock:
+            while self._wakeups and self._wakeups[0][2].done():
+                heapq.heappop(self._wakeups)
+            if not self._wakeups:
+                return
+            self._now = max(self._now, self._wakeups[0][0])
+            due = []
+            while self._wakeups and self._wakeups[0][0] <= self._now:
+                due.append(heapq.heappop(self._wakeups)[2])
+        for wakeup in due:
+            if not wakeup.done():
+                wakeup.set_result(None)
+
+
 class SearchPolicies:    
     @staticmethod
     def on_value_type_and_value(target_type: type, op: Callable, target_val: Any):
@@ -58,20 +225,196 @@ class LogEntry(SearchableDict):
     pass
 
 
+class RetryMetrics:
+    """Running totals of retried operations, kept as counters so they cost the same however long
+    the service runs. One instance can be shared by many logs and policies, and is exported in the
+    Prometheus text format"""
+
+    # Upper bounds in seconds of the run time histogram buckets
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        self._buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self._buckets) + 1)
+        self._attempts = 0
+        self._successes = 0
+        self._rejections = 0
+        self._total_wait = 0.0
+        self._total_run_time = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def attempts(self) -> int:
+        """Attempts made, not counting those rejected"""
+        return self._attempts
+
+    @property
+    def successes(self) -> int:
+        return self._successes
+
+    @property
+    def rejections(self) -> int:
+        """Attempts turned away by a circuit breaker or retry budget"""
+        return self._rejections
+
+    @property
+    def total_wait(self) -> float:
+        """Seconds of backoff scheduled between attempts"""
+        return self._total_wait
+
+    def observe_attempt(self, passed: bool, run_time: float) -> None:
+        with self._lock:
+            self._attempts += 1
+            self._successes += passed
+            self._total_run_time += run_time
+            self._bucket_counts[bisect.bisect_left(self._buckets, run_time)] += 1
+
+    def observe_rejection(self) -> None:
+        with self._lock:
+            self._rejections += 1
+
+    def observe_wait(self, wait: float) -> None:
+        with self._lock:
+            self._total_wait += wait
+
+    def to_prometheus(self, prefix: str = "retry", labels: dict[str, str] = None) -> str:
+        """The counters and run time histogram in the Prometheus text exposition format"""
+        label_text = ",".join(f'{name}="{value}"' for name, value in (labels or {}).items())
+
+        def sample(name: str, value: Any, extra: str = "") -> str:
+            all_labels = ",".join(text for text in (label_text, extra) if text)
+            return f"{prefix}_{name}{{{all_labels}}} {value}" if all_labels else f"{prefix}_{name} {value}"
+
+        lines = []
+        for name, help_text, value in (
+            ("attempts_total", "Attempts made", self._attempts),
+            ("successes_total", "Attempts that passed", self._successes),
+            ("rejections_total", "Attempts rejected by a circuit breaker or retry budget", self._rejections),
+            ("wait_seconds_total", "Backoff scheduled between attempts", self._total_wait),
+        ):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.append(sample(name, value))
+        lines.append(f"# HELP {prefix}_run_seconds Time from the start of the operation to the end of each attempt")
+        lines.append(f"# TYPE {prefix}_run_seconds histogram")
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), self._bucket_counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(sample("run_seconds_bucket", cumulative, f'le="{le}"'))
+        lines.append(sample("run_seconds_sum", self._total_run_time))
+        lines.append(sample("run_seconds_count", self._attempts))
+        return "\n".join(lines) + "\n"
+
+
 class RetryLogs:
-    def __init__(self) -> None:
-        self._detail = []
+    """The most recent log items, up to the capacity, in a ring buffer. The numeric attrs of each item
+    are also held in columns, with indexes on the attempt number and pass, so queries do not need to
+    scan every item. Totals over all items, including those dropped, are kept in the metrics.
+    The buffer grows as items are added until it reaches the capacity, so the log of a call that
+    passes first time stays small"""
+
+    def __init__(self, capacity: int = 1024, metrics: RetryMetrics = None) -> None:
+        self._capacity = capacity
+        self._detail: list[LogEntry] = []
+        self._start = 0
+        self._count = 0
+        self._attempt = array.array("l")
+        self._pass = array.array("b")
+        self._total_retry_time = array.array("d")
+        self._next_attempt_in = array.array("d")
+        self._by_attempt: dict[int, set[int]] = collections.defaultdict(set)
+        self._by_pass: dict[bool, set[int]] = {True: set(), False: set()}
+        self._metrics = metrics if metrics is not None else RetryMetrics()
+
+    @property
+    def metrics(self) -> RetryMetrics:
+        return self._metrics
+
+    def _slot(self, index: int) -> int:
+        """Position in the buffer of log item number index"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("log item index out of range")
+        return (self._start + index) % self._capacity
+
+    def _forget(self, slot: int) -> None:
+        self._by_attempt[self._attempt[slot]].discard(slot)
+        self._by_pass[bool(self._pass[slot])].discard(slot)
+
+    def _record(self, slot: int, item: LogEntry) -> None:
+        self._detail[slot] = item
+        self._attempt[slot] = item["attempt"]
+        self._pass[slot] = item["pass"]
+        self._total_retry_time[slot] = item["total_retry_time"]
+        self._next_attempt_in[slot] = (
+            item["next_attempt_in"] if "next_attempt_in" in item else math.nan
+        )
+        self._by_attempt[item["attempt"]].add(slot)
+        self._by_pass[bool(item["pass"])].add(slot)
+
+    def append(self, item: LogEntry) -> None:
+        """Append log item to end of the logs, dropping the oldest when full"""
+        if self._count == self._capacity:
+            slot = self._start
+            self._forget(slot)
+            self._start = (self._start + 1) % self._capacity
+        else:
+            # Until the buffer is full the oldest item is in slot 0, so the next slot is a new one
+            slot = self._count
+            self._detail.append(None)
+            self._attempt.append(0)
+            self._pass.append(0)
+            self._total_retry_time.append(0.0)
+            self._next_attempt_in.append(math.nan)
+            self._count += 1
+        self._record(slot, item)
+        if "rejected" in item:
+            self._metrics.observe_rejection()
+        else:
+            self._metrics.observe_attempt(item["pass"], item["total_retry_time"])
+
+    def annotate(self, key: str, value: Any) -> None:
+        """Add or replace an attr of the newest log item"""
+        slot = self._slot(-1)
+        self._detail[slot][key] = value
+        if key == "next_attempt_in":
+            self._next_attempt_in[slot] = value
+            self._metrics.observe_wait(value)
 
-    def append(self, item: dict[str, Any]) -> None:
-        """Append log item to end of the logs"""
-        self._detail.append(item)
+    def column(self, key: str) -> list:
+        """Values of a numeric attr (attempt, pass, total_retry_time, next_attempt_in) in log order,
+        missing values are nan"""
+        values = {
+            "attempt": self._attempt,
+            "pass": self._pass,
+            "total_retry_time": self._total_retry_time,
+            "next_attempt_in": self._next_attempt_in,
+        }[key]
+        ordered = [values[(self._start + index) % self._capacity] for index in range(self._count)]
+        return [bool(value) for value in ordered] if key == "pass" else ordered
+
+    def _in_log_order(self, slots: set[int]) -> list[LogEntry]:
+        return [
+            self._detail[slot]
+            for slot in sorted(slots, key=lambda slot: (slot - self._start) % self._capacity)
+        ]
+
+    def with_attempt(self, attempt: int) -> list[LogEntry]:
+        """Log items for attempt number attempt, found through the index"""
+        return self._in_log_order(self._by_attempt.get(attempt, set()))
+
+    def with_pass(self, passed: bool) -> list[LogEntry]:
+        """Log items that passed or failed, found through the index"""
+        return self._in_log_order(self._by_pass[passed])
 
     def extract_entry(self, fn: Callable):
-        return [each for each in self._detail if each.extract(fn) != dict()]
+        return [each for each in self if each.extract(fn) != dict()]
 
     def extract(self, fn: Callable):
         res = []
-        for each in self._detail:
+        for each in self:
             attrs = each.extract(fn)
             if attrs != dict():
                 res.append(attrs)
@@ -79,23 +422,193 @@ class RetryLogs:
 
     def __setitem__(self, __key: Any, __value: Any) -> None:
         """Update a log item already in the logs"""
-        self._detail[__key] = __value
+        slot = self._slot(__key)
+        self._forget(slot)
+        self._record(slot, __value)
 
     def __getitem__(self, __key: Any) -> Any:
         """Get log item number __key"""
-        return self._detail[__key]
+        return self._detail[self._slot(__key)]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        return (self._detail[(self._start + index) % self._capacity] for index in range(self._count))
 
     def __contains__(self, __key: Any) -> bool:
         """Is log item present in log"""
-        return self._detail.__contains__(__key)
+        return any(each is __key for each in self)
 
     def __str__(self) -> str:
-        return str(self._detail)
+        return str(list(self))
 
     def __repr__(self) -> str:
         """pprint style formatting"""
         from pprint import pformat
-        return pformat(self._detail, indent=4, width=1)
+        return pformat(list(self), indent=4, width=1)
+
+
+class RetryState:
+    """Progress of one operation being retried, kept apart from the policy configuration
+    so that one policy can drive many operations at the same time"""
+
+    def __init__(self, clock: SystemClock | VirtualClock = None) -> None:
+        self._clock = clock if clock is not None else SystemClock()
+        self._attempt = 0
+        self._current_wait = 0.0
+        self._last_wait_time = 0.0
+        self._start_time = self._clock.time()
+        # Circuit breaker state changes waiting to be logged
+        self._circuit_transitions: list[str] = []
+
+    @property
+    def run_time(self) -> float:
+        """Get the total runtime of the method being tried in seconds"""
+        return self._clock.time() - self._start_time
+
+    @property
+    def attempts(self) -> int:
+        """Number of attemps made (including initial attempt)"""
+        return self._attempt
+
+
+class CircuitBreaker:
+    """Stop calling a failing resource. Closed lets calls through, once the failure rate of the last
+    window calls reaches the threshold it opens and calls fail fast. After the reset timeout it is
+    half open and lets trial calls through, closing on a success or opening again on a failure.
+    One breaker is shared by all the policies calling the same resource"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        window: int = 20,
+        minimum_calls: int = 5,
+        reset_timeout: Duration | float = 30,
+        half_open_calls: int = 1,
+        clock: SystemClock | VirtualClock = None,
+    ) -> None:
+        self._clock = clock if clock is not None else SystemClock()
+        self._failure_threshold = failure_threshold
+        self._minimum_calls = minimum_calls
+        self._reset_timeout = reset_timeout
+        self._half_open_calls = half_open_calls
+        self._outcomes = collections.deque(maxlen=window)
+        self._state = CircuitBreaker.CLOSED
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def failure_rate(self) -> float:
+        """Failures as a fraction of the calls in the window"""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _move_to(self, new_state: str) -> str:
+        """Change state returning the transition for the retry logs"""
+        transition = f"{self._state}->{new_state}"
+        self._state = new_state
+        if new_state == CircuitBreaker.OPEN:
+            self._opened_at = self._clock.time()
+        elif new_state == CircuitBreaker.HALF_OPEN:
+            self._trial_calls = 0
+        else:
+            self._outcomes.clear()
+        return transition
+
+    def allow_request(self) -> tuple[bool, str]:
+        """Can a call be made now, and the state transition this caused if any"""
+        with self._lock:
+            transition = None
+            if (
+                self._state == CircuitBreaker.OPEN
+                and self._clock.time() - self._opened_at >= self._reset_timeout
+            ):
+                transition = self._move_to(CircuitBreaker.HALF_OPEN)
+            if self._state == CircuitBreaker.CLOSED:
+                return True, transition
+            if (
+                self._state == CircuitBreaker.HALF_OPEN
+                and self._trial_calls < self._half_open_calls
+            ):
+                self._trial_calls += 1
+                return True, transition
+            return False, transition
+
+    def record(self, passed: bool) -> str:
+        """Record the outcome of a call, returning the state transition this caused if any"""
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                return self._move_to(
+                    CircuitBreaker.CLOSED if passed else CircuitBreaker.OPEN
+                )
+            self._outcomes.append(passed)
+            if (
+                self._state == CircuitBreaker.CLOSED
+                and len(self._outcomes) >= self._minimum_calls
+                and self.failure_rate >= self._failure_threshold
+            ):
+                return self._move_to(CircuitBreaker.OPEN)
+            return None
+
+
+class RetryBudget:
+    """Token bucket limiting the retries made by all the policies sharing it, so a failing resource
+    is not flooded with retries. Each retry (not the initial attempt) takes a token, tokens are
+    refilled at a steady rate up to the capacity"""
+
+    def __init__(
+        self,
+        capacity: float = 10,
+        refill_per_second: float = 1.0,
+        clock: SystemClock | VirtualClock = None,
+    ) -> None:
+        self._clock = clock if clock is not None else SystemClock()
+        self._capacity = capacity
+        self._refill_per_second = refill_per_second
+        self._tokens = float(capacity)
+        self._last_refill = self._clock.time()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        """Retries currently available"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def _refill(self) -> None:
+        now = self._clock.time()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._last_refill) * self._refill_per_second,
+        )
+        self._last_refill = now
+
+    def try_acquire(self) -> bool:
+        """Take a token for a retry, False when the budget is spent"""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def release(self) -> None:
+        """Give back a token taken for a retry that was not made"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._capacity, self._tokens + 1)
 
 
 class RetryPolicy:
@@ -106,20 +619,31 @@ class RetryPolicy:
         self._backoff_rate = 2
         self._multiplier = 1
         self._max_interval = 500
+        self._attempt_timeout = None
+        self._circuit_breaker = None
+        self._retry_budget = None
+        self._metrics = None
+        self._clock = SystemClock()
+        self._state = RetryState(self._clock)
 
     def __enter__(self):
         """Enter the context manager"""
-        self._current_wait = 0.0
-        self._attempt = 0
-        self._last_wait_time = 0.0
-        self._start_time = time.time()
+        self._state = RetryState(self._clock)
         return self
 
     def __exit__(self, type, value, traceback):
         """Exit the context manager"""
-        self._attempt = 0
-        self._current_wait = 0.0
-        self._last_wait_time = 0.0
+        self._state._attempt = 0
+        self._state._current_wait = 0.0
+        self._state._last_wait_time = 0.0
+
+    async def __aenter__(self):
+        """Enter the async context manager"""
+        return self.__enter__()
+
+    async def __aexit__(self, type, value, traceback):
+        """Exit the async context manager"""
+        self.__exit__(type, value, traceback)
 
     def set_initial_interval(self, interval_timer: Duration | int) -> "RetryPolicy":
         """Configure the intial retry wait period in seconds"""
@@ -165,11 +689,38 @@ class RetryPolicy:
         self._max_attempts = attempts
         return self
 
-    def calc_backoff_wait_interval(self) -> float:
+    def set_attempt_timeout(self, interval_time: Duration | float) -> "RetryPolicy":
+        """Configure how long in seconds an async attempt may run before it is abandoned and retried"""
+        self._attempt_timeout = interval_time
+        return self
+
+    def set_circuit_breaker(self, circuit_breaker: CircuitBreaker) -> "RetryPolicy":
+        """Fail fast without waiting while the circuit breaker is open"""
+        self._circuit_breaker = circuit_breaker
+        return self
+
+    def set_retry_budget(self, retry_budget: RetryBudget) -> "RetryPolicy":
+        """Stop retrying once the shared retry budget is spent"""
+        self._retry_budget = retry_budget
+        return self
+
+    def set_clock(self, clock: SystemClock | VirtualClock) -> "RetryPolicy":
+        """Clock used to time the runs and to wait between attempts, a VirtualClock makes the waits instant"""
+        self._clock = clock
+        self._state = RetryState(clock)
+        return self
+
+    def set_metrics(self, metrics: RetryMetrics) -> "RetryPolicy":
+        """Add the attempts of every run to the shared metrics"""
+        self._metrics = metrics
+        return self
+
+    def calc_backoff_wait_interval(self, state: RetryState = None) -> float:
         """Basic backoff using coefficient"""
-        return self._intial_interval + (self._backoff_rate * self._last_wait_time)
+        state = self._state if state is None else state
+        return self._intial_interval + (self._backoff_rate * state._last_wait_time)
 
-    def calc_jitter_wait_interval(self) -> float:
+    def calc_jitter_wait_interval(self, state: RetryState = None) -> float:
         """Calculate the current wait jitter wait interval"""
         random_interval = self._random_fn(self._min_jitter, self._max_jitter)
         if self._add:
@@ -178,59 +729,249 @@ class RetryPolicy:
             wait_interval = (self._initial_interval * 2**self._power) - random_interval
         return wait_interval
 
-    def calc_exponential_wait_interval(self) -> float:
+    def calc_exponential_wait_interval(self, state: RetryState = None) -> float:
         """Calculate the current wait exponential wait interval"""
-        return self._intial_interval * self._multiplier**self.attempts
+        state = self._state if state is None else state
+        return self._intial_interval * self._multiplier**state.attempts
 
     @property
     def run_time(self) -> float:
         """Get the total runtime of the method being tried in seconds"""
-        return time.time() - self._start_time
+        return self._state.run_time
 
     @property
     def attempts(self) -> int:
         """Number of attemps made (including initial attempt)"""
-        return self._attempt
+        return self._state.attempts
 
-    def run_resource(self, fn: Callable, success_fn: Callable) -> RetryLogs:
-        """Run a callable function, with the retry policy"""
-        successful_operation = False
-        retry_log = RetryLogs()
-        while (
-            self._start_time + self._current_wait
-            <= self._start_time + self._max_interval
-        ) and self._attempt <= self._max_attempts:
-            self._attempt += 1
-            time.sleep(self._current_wait)
-            result = fn()
-            pass_run = success_fn(result, self)
+    def _can_attempt(self, state: RetryState) -> bool:
+        """Is another attempt allowed within the maximum interval and attempts"""
+        return (
+            state._start_time + state._current_wait
+            <= state._start_time + self._max_interval
+        ) and state._attempt <= self._max_attempts
+
+    def _admit(self, retry_log: RetryLogs, state: RetryState) -> bool:
+        """Check the retry budget and circuit breaker allow the next attempt, logging when they do not.
+        A retry token taken before the circuit breaker rejects the attempt is given back"""
+        rejected = None
+        acquired = False
+        if state._attempt > 0 and self._retry_budget is not None:
+            acquired = self._retry_budget.try_acquire()
+            if not acquired:
+                rejected = "retry_budget"
+        if rejected is None and self._circuit_breaker is not None:
+            allowed, transition = self._circuit_breaker.allow_request()
+            if transition:
+                state._circuit_transitions.append(transition)
+            if not allowed:
+                rejected = "circuit_open"
+                if acquired:
+                    self._retry_budget.release()
+        if rejected:
             retry_log.append(
                 LogEntry(
                     {
-                        "attempt": self._attempt,
-                        "pass": pass_run,
-                        "total_retry_time": f"{self.run_time:.2f}",
+                        "attempt": state._attempt + 1,
+                        "pass": False,
+                        "total_retry_time": state.run_time,
+                        "rejected": rejected,
                     }
                 )
             )
-            if result is not None:
-                retry_log[-1]["result"] = result
-            if pass_run:
-                successful_operation = True
-                break
-            self._last_wait_time = self._current_wait
-            self._current_wait = self._calc_wait_interval()
-            retry_log[-1]['next_attempt_in'] = self._current_wait
-        if successful_operation and self.attempts > 1:
+            self._log_transitions(retry_log, state)
+        return rejected is None
+
+    def _record_outcome(self, retry_log: RetryLogs, pass_run: bool, state: RetryState) -> None:
+        """Tell the circuit breaker how the attempt went and log any state change"""
+        if self._circuit_breaker is not None:
+            transition = self._circuit_breaker.record(pass_run)
+            if transition:
+                state._circuit_transitions.append(transition)
+        self._log_transitions(retry_log, state)
+
+    @staticmethod
+    def _log_transitions(retry_log: RetryLogs, state: RetryState) -> None:
+        if state._circuit_transitions:
+            retry_log.annotate("circuit", ", ".join(state._circuit_transitions))
+            state._circuit_transitions.clear()
+
+    def _log_attempt(
+        self, retry_log: RetryLogs, result: Any, pass_run: bool, state: RetryState
+    ) -> None:
+        """Record the outcome of the attempt just made"""
+        retry_log.append(
+            LogEntry(
+                {
+                    "attempt": state._attempt,
+                    "pass": pass_run,
+                    "total_retry_time": state.run_time,
+                }
+            )
+        )
+        if result is not None:
+            retry_log.annotate("result", result)
+
+    def _next_wait(self, retry_log: RetryLogs, state: RetryState) -> None:
+        """Back off before the next attempt"""
+        state._last_wait_time = state._current_wait
+        state._current_wait = self._calc_wait_interval(state)
+        retry_log.annotate("next_attempt_in", state._current_wait)
+
+    def _report(self, successful_operation: bool, state: RetryState) -> None:
+        if successful_operation and state.attempts > 1:
             print(
-                f"Operation passed after {self.attempts} attempts lasting {self.run_time:.2f}"
+                f"Operation passed after {state.attempts} attempts lasting {state.run_time:.2f}"
             )
         elif not successful_operation:
             print(
-                f"Operation failed after {self.attempts} attempts lasting {self.run_time:.2f}"
+                f"Operation failed after {state.attempts} attempts lasting {state.run_time:.2f}"
             )
+
+    def _log_error(self, retry_log: RetryLogs, err: Exception, state: RetryState) -> None:
+        """Record an attempt that raised or was interrupted as a failure"""
+        self._log_attempt(retry_log, None, False, state)
+        retry_log.annotate("error", repr(err))
+        self._record_outcome(retry_log, False, state)
+
+    def run_resource(self, fn: Callable, success_fn: Callable) -> RetryLogs:
+        """Run a callable function, with the retry policy. An attempt raising an exception is logged
+        as a failed attempt, any other interruption is logged the same way before it is raised"""
+        state = self._state
+        successful_operation = False
+        retry_log = RetryLogs(metrics=self._metrics)
+        while self._can_attempt(state) and self._admit(retry_log, state):
+            state._attempt += 1
+            self._clock.sleep(state._current_wait)
+            try:
+                result = fn()
+                pass_run = success_fn(result, self)
+            except Exception as err:
+                self._log_error(retry_log, err, state)
+            except BaseException as err:
+                self._log_error(retry_log, err, state)
+                raise
+            else:
+                self._log_attempt(retry_log, result, pass_run, state)
+                self._record_outcome(retry_log, pass_run, state)
+                if pass_run:
+                    successful_operation = True
+                    break
+            self._next_wait(retry_log, state)
+        self._report(successful_operation, state)
         return retry_log
 
+    async def run_resource_async(
+        self, fn: Callable[[], Awaitable], success_fn: Callable
+    ) -> RetryLogs:
+        """Await a callable returning an awaitable, with the retry policy, without blocking the event loop.
+        An attempt running longer than the attempt timeout is cancelled and counts as a failure, as does
+        one raising an exception. When the operation itself is cancelled the attempt is recorded as a
+        failure, so the circuit breaker gets its trial call back, before the cancellation is raised.
+        Each concurrent operation needs its own policy as the policy holds the state of the attempts"""
+        state = self._state
+        successful_operation = False
+        retry_log = RetryLogs(metrics=self._metrics)
+        while self._can_attempt(state) and self._admit(retry_log, state):
+            state._attempt += 1
+            await self._clock.sleep_async(state._current_wait)
+            try:
+                result = await self._clock.wait_for(fn(), self._attempt_timeout)
+                pass_run = success_fn(result, self)
+            except asyncio.TimeoutError:
+                self._log_attempt(retry_log, None, False, state)
+                retry_log.annotate("timed_out", True)
+                self._record_outcome(retry_log, False, state)
+            except Exception as err:
+                self._log_error(retry_log, err, state)
+            except BaseException as err:
+                self._log_error(retry_log, err, state)
+                raise
+            else:
+                self._log_attempt(retry_log, result, pass_run, state)
+                self._record_outcome(retry_log, pass_run, state)
+                if pass_run:
+                    successful_operation = True
+                    break
+            self._next_wait(retry_log, state)
+        self._report(successful_operation, state)
+        return retry_log
+
+
+class RetryExecutor:
+    """Run many callables concurrently, each retried with the same policy.
+    The policy is only read, each call keeps its own RetryState and RetryLogs. At most max_workers
+    calls run at once and calls waiting to retry do not hold a worker, so the total time is close
+    to that of the slowest call rather than the sum of them all"""
+
+    def __init__(self, retry_policy: RetryPolicy, max_workers: int = 8) -> None:
+        self._retry_policy = retry_policy
+        self._max_workers = max_workers
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        """Wait for any running calls to finish and release the workers"""
+        self._pool.shutdown()
+
+    def run_resources(self, fns: list[Callable], success_fn: Callable) -> list[RetryLogs]:
+        """Run the callables with the retry policy, the success function is given the result and
+        the RetryState of the call. A call raising an exception is logged as a failed attempt.
+        The logs are returned in the order of the callables"""
+        policy = self._retry_policy
+        clock = policy._clock
+        states = [RetryState(clock) for _ in fns]
+        logs = [RetryLogs(metrics=policy._metrics) for _ in fns]
+        passed = [False] * len(fns)
+        # Calls ready to attempt, ordered by when their wait ends
+        waiting = [(0.0, call_no) for call_no in range(len(fns))]
+        running: dict[concurrent.futures.Future, int] = {}
+        while waiting or running:
+            now = clock.time()
+            while waiting and waiting[0][0] <= now and len(running) < self._max_workers:
+                _, call_no = heapq.heappop(waiting)
+                if not policy._admit(logs[call_no], states[call_no]):
+                    policy._report(False, states[call_no])
+                    continue
+                states[call_no]._attempt += 1
+                running[self._pool.submit(fns[call_no])] = call_no
+            timeout = max(waiting[0][0] - now, 0.0) if waiting else None
+            if not running:
+                if waiting:
+                    clock.sleep(timeout)
+                continue
+            if len(running) >= self._max_workers:
+                timeout = None
+            done, _ = clock.wait(running, timeout)
+            for future in done:
+                call_no = running.pop(future)
+                state = states[call_no]
+                try:
+                    result = future.result()
+                except Exception as err:
+                    policy._log_attempt(logs[call_no], None, False, state)
+                    logs[call_no].annotate("error", repr(err))
+                else:
+                    passed[call_no] = success_fn(result, state)
+                    policy._log_attempt(logs[call_no], result, passed[call_no], state)
+                policy._record_outcome(logs[call_no], passed[call_no], state)
+                if passed[call_no]:
+                    policy._report(True, state)
+                    continue
+                policy._next_wait(logs[call_no], state)
+                if policy._can_attempt(state):
+                    heapq.heappush(
+                        waiting, (clock.time() + state._current_wait, call_no)
+                    )
+                else:
+                    policy._report(False, state)
+        return logs
+
 
 if __name__ == "__main__":
     import operator as op
@@ -260,12 +1001,16 @@ if __name__ == "__main__":
     assert Duration.of_milliseconds(50) == 0.05
     assert Duration.of_minutes(50) == 50 * 60
 
+    # The waits advance a virtual clock, so the backoff timings are checked without sleeping
+    virtual_clock = VirtualClock()
+
     retry_policy = (
         RetryPolicy()
         .set_initial_interval(Duration.of_seconds(1))
         .set_maximum_interval(Duration.of_seconds(60))
         .set_backoff_coefficient(1.5)
         .set_maximum_attempts(5)
+        .set_clock(virtual_clock)
     )
 
     with retry_policy as retry:
@@ -300,7 +1045,7 @@ if __name__ == "__main__":
     # Check rerun recovers
     # and recovery took place on the 3rd atempt and that the time taken is as expected
     assert attempts == 3
-    assert exec_time > 3.5 and exec_time < 4.0
+    assert exec_time >= 3.5 and exec_time < 4.0
 
     # Test instance method invocation
     tc = TestClass()
@@ -312,7 +1057,7 @@ if __name__ == "__main__":
 
     # Test that recovery took place on the 3rd atempt and that the time taken is as expected
     assert attempts == 3
-    assert exec_time > 3.5 and exec_time < 4.0
+    assert exec_time >= 3.5 and exec_time < 4.0
 
     print("exponential retry policy")
     exponential_retry_policy = (
@@ -320,6 +1065,7 @@ if __name__ == "__main__":
         .set_initial_interval(Duration.of_seconds(1))
         .set_exponential_backoff(3)
         .set_maximum_attempts(5)
+        .set_clock(virtual_clock)
     )
 
     with exponential_retry_policy as retry:
@@ -337,6 +1083,7 @@ if __name__ == "__main__":
         .set_initial_interval(Duration.of_seconds(1))
         .set_jitter_backoff(1.0, randon_fn=pr.not_so_random)
         .set_maximum_attempts(5)
+        .set_clock(virtual_clock)
     )
 
     with jitter_retry_policy as retry:
@@ -347,3 +1094,347 @@ if __name__ == "__main__":
 
     assert attempts == 6
     assert exec_time > 27.0 and exec_time < 27.4
+
+    # The same backoff run thousands of times gives exactly the same timings
+    start = time.time()
+    for _ in range(2000):
+        with retry_policy as retry:
+            retry.run_resource(lambda: None, success)
+            assert abs(retry.run_time - 3.5) < 1e-9
+    exec_time = time.time() - start
+    print(f"2000 virtual retried runs took {exec_time:.2f}")
+    assert exec_time < 2.0
+
+
+    print("async retry policy")
+
+    def async_retry_policy() -> RetryPolicy:
+        return (
+            RetryPolicy()
+            .set_initial_interval(Duration.of_milliseconds(100))
+            .set_maximum_interval(Duration.of_seconds(60))
+            .set_backoff_coefficient(1.5)
+            .set_maximum_attempts(5)
+        )
+
+    async def run_async_method(a):
+        """Stub coroutine to run"""
+        await asyncio.sleep(0.01)
+        return a
+
+    async def retried_operation(a) -> tuple[int, RetryLogs]:
+        async with async_retry_policy() as retry:
+            log_inspect = await retry.run_resource_async(
+                lambda: run_async_method(a), success
+            )
+            return retry.attempts, log_inspect
+
+    async def many_retried_operations(count: int):
+        return await asyncio.gather(*(retried_operation(a) for a in range(count)))
+
+    # Backoff sleeps overlap on the one event loop rather than adding up
+    start = time.time()
+    outcomes = asyncio.run(many_retried_operations(1000))
+    exec_time = time.time() - start
+    assert all(attempts == 3 for attempts, _ in outcomes)
+    assert outcomes[7][1][-1]["result"] == 7
+    assert exec_time < 5.0
+
+    async def timed_out_operation():
+        async with (
+            async_retry_policy()
+            .set_attempt_timeout(Duration.of_milliseconds(50))
+            .set_maximum_attempts(1)
+        ) as retry:
+            log_inspect = await retry.run_resource_async(
+                lambda: asyncio.sleep(10), success
+            )
+            return retry.attempts, log_inspect
+
+    attempts, log_inspect = asyncio.run(timed_out_operation())
+    pprint.pprint(log_inspect)
+    assert attempts == 2
+    assert log_inspect[1]["timed_out"] and not log_inspect[1]["pass"]
+
+    # Concurrent sleeps on one virtual clock overlap, as they would on the wall clock
+    def virtual_retry_policy(clock: VirtualClock) -> RetryPolicy:
+        return (
+            RetryPolicy()
+            .set_initial_interval(Duration.of_seconds(1))
+            .set_maximum_interval(Duration.of_seconds(60))
+            .set_backoff_coefficient(1.5)
+            .set_maximum_attempts(5)
+            .set_clock(clock)
+        )
+
+    async def instant_method(a):
+        await asyncio.sleep(0)
+        return a
+
+    async def virtual_retried_operation(a, clock: VirtualClock, delay: float = 0.0) -> float:
+        await clock.sleep_async(delay)
+        async with virtual_retry_policy(clock) as retry:
+            await retry.run_resource_async(lambda: instant_method(a), success)
+            return retry.run_time
+
+    async def many_virtual_operations(clock: VirtualClock, delays: list[float]) -> list[float]:
+        return await asyncio.gather(
+            *(virtual_retried_operation(a, clock, delay) for a, delay in enumerate(delays))
+        )
+
+    alone_clock = VirtualClock()
+    alone = asyncio.run(many_virtual_operations(alone_clock, [0.0]))[0]
+    assert alone > 0 and alone_clock.time() == alone
+    shared_clock = VirtualClock()
+    run_times = asyncio.run(many_virtual_operations(shared_clock, [0.0] * 10))
+    assert run_times == [alone] * 10 and shared_clock.time() == alone
+    # Staggered starts finish staggered by the same amounts
+    staggered_clock = VirtualClock()
+    run_times = asyncio.run(many_virtual_operations(staggered_clock, [0.0, 0.25, 4.0]))
+    assert run_times == [alone] * 3 and staggered_clock.time() == 4.0 + alone
+
+    # Attempt timeouts are virtual too, an attempt sleeping past its timeout is abandoned when the
+    # clock reaches it, while one awaiting anything else holds the clock
+    async def virtual_timeouts(clock: VirtualClock) -> tuple[RetryLogs, float, RetryLogs, RetryLogs]:
+        async with virtual_retry_policy(clock).set_attempt_timeout(5.0).set_maximum_attempts(1) as retry:
+            timed_out = await retry.run_resource_async(lambda: clock.sleep_async(10.0), failure)
+            timed_out_time = retry.run_time
+        async with virtual_retry_policy(clock).set_attempt_timeout(5.0) as retry:
+            in_time = await retry.run_resource_async(lambda: clock.sleep_async(2.0), lambda result, policy: True)
+        async with virtual_retry_policy(clock).set_attempt_timeout(0.001) as retry:
+            real_wait = await retry.run_resource_async(lambda: asyncio.sleep(0.05), lambda result, policy: True)
+        return timed_out, timed_out_time, in_time, real_wait
+
+    timeout_clock = VirtualClock()
+    start = time.time()
+    timed_out, timed_out_time, in_time, real_wait = asyncio.run(virtual_timeouts(timeout_clock))
+    assert time.time() - start < 1.0
+    assert len(timed_out) == 2 and all(entry["timed_out"] for entry in timed_out)
+    assert timed_out_time == 5.0 + 1.0 + 5.0
+    assert len(in_time) == 1 and in_time[0]["pass"] and in_time[0]["total_retry_time"] == 2.0
+    assert len(real_wait) == 1 and real_wait[0]["pass"]
+    assert timeout_clock.time() == 13.0
+
+    # The executor waits on a virtual clock too, calls retrying at the same time overlap
+    executor_clock = VirtualClock()
+    start = time.time()
+    with RetryExecutor(virtual_retry_policy(executor_clock), max_workers=4) as executor:
+        logs = executor.run_resources([lambda a=a: a for a in range(8)], success)
+    assert time.time() - start < 1.0
+    assert all(log[-1]["pass"] and log[-1]["total_retry_time"] == alone for log in logs)
+    assert executor_clock.time() == alone
+
+    # Blocking sleeps on one virtual clock can only come from one thread
+    thread_clock = VirtualClock()
+    thread_clock.sleep(1.0)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as other_thread:
+        try:
+            other_thread.submit(thread_clock.sleep, 1.0).result()
+            raise AssertionError("A second sleeping thread was allowed")
+        except RuntimeError:
+            pass
+
+    print("retry executor")
+
+    def flaky_fetch(a):
+        """Stub fetch that takes a while on every attempt"""
+        time.sleep(0.05)
+        return a
+
+    executor_retry_policy = (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(200))
+        .set_maximum_interval(Duration.of_seconds(60))
+        .set_backoff_coefficient(1.5)
+        .set_maximum_attempts(5)
+    )
+
+    # 100 calls recovering on the 3rd attempt each wait 0.7s, run one after the other that is over 70s
+    start = time.time()
+    with RetryExecutor(executor_retry_policy, max_workers=50) as executor:
+        logs = executor.run_resources(
+            [lambda a=a: flaky_fetch(a) for a in range(100)], success
+        )
+    exec_time = time.time() - start
+    print(f"100 retried calls took {exec_time:.2f}")
+    assert all(log[-1]["attempt"] == 3 and log[-1]["pass"] for log in logs)
+    assert [log[-1]["result"] for log in logs] == list(range(100))
+    assert exec_time < 3.0
+
+    # Exceptions raised are logged as failed attempts
+    raising_retry_policy = (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(200))
+        .set_backoff_coefficient(1.5)
+        .set_maximum_attempts(1)
+    )
+    with RetryExecutor(raising_retry_policy) as executor:
+        logs = executor.run_resources([lambda: 1 / 0], success)
+    pprint.pprint(logs)
+    assert len(logs) == 1 and logs[0][1]["error"] == "ZeroDivisionError('division by zero')"
+
+    print("circuit breaker and retry budget")
+    circuit_breaker = CircuitBreaker(
+        failure_threshold=0.5,
+        window=4,
+        minimum_calls=4,
+        reset_timeout=0.3,
+        clock=virtual_clock,
+    )
+    breaker_retry_policy = (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(10))
+        .set_backoff_coefficient(1.0)
+        .set_maximum_attempts(5)
+        .set_circuit_breaker(circuit_breaker)
+        .set_clock(virtual_clock)
+    )
+
+    # Four failures open the circuit, the remaining attempts fail fast without waiting
+    with breaker_retry_policy as retry:
+        log_inspect = retry.run_resource(lambda: run_unbound_method(16), failure)
+        attempts = retry.attempts
+    pprint.pprint(log_inspect)
+    assert attempts == 4
+    assert log_inspect[3]["circuit"] == "closed->open"
+    assert log_inspect[4]["rejected"] == "circuit_open"
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+
+    # After the reset timeout a trial call is let through and its success closes the circuit
+    virtual_clock.advance(0.3)
+    with breaker_retry_policy as retry:
+        log_inspect = retry.run_resource(
+            lambda: run_unbound_method(16), lambda result, policy: True
+        )
+    pprint.pprint(log_inspect)
+    assert log_inspect[0]["pass"]
+    assert log_inspect[0]["circuit"] == "open->half_open, half_open->closed"
+    assert circuit_breaker.state == CircuitBreaker.CLOSED
+
+    def unreachable():
+        raise ConnectionError("backend down")
+
+    # A raising resource counts as a failure, and a raising trial call reopens the circuit
+    # rather than keeping its half open slot
+    with breaker_retry_policy as retry:
+        log_inspect = retry.run_resource(unreachable, success)
+    pprint.pprint(log_inspect)
+    assert log_inspect[0]["error"] == "ConnectionError('backend down')"
+    assert log_inspect[3]["circuit"] == "closed->open" and log_inspect[4]["rejected"] == "circuit_open"
+    virtual_clock.advance(0.3)
+    with breaker_retry_policy as retry:
+        log_inspect = retry.run_resource(unreachable, success)
+    assert log_inspect[0]["circuit"] == "open->half_open, half_open->open"
+    assert log_inspect[1]["rejected"] == "circuit_open"
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+
+    # Async trials that raise or are cancelled give their half open slot back too
+    async def trial_cancelled():
+        task = asyncio.create_task(
+            RetryPolicy()
+            .set_initial_interval(Duration.of_milliseconds(10))
+            .set_backoff_coefficient(1.0)
+            .set_maximum_attempts(0)
+            .set_circuit_breaker(circuit_breaker)
+            .run_resource_async(lambda: asyncio.sleep(10), success)
+        )
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+            raise AssertionError("The cancellation was not raised")
+        except asyncio.CancelledError:
+            pass
+
+    async def trial_raising():
+        async def unreachable_async():
+            raise ConnectionError("backend down")
+
+        return await (
+            RetryPolicy()
+            .set_initial_interval(Duration.of_milliseconds(10))
+            .set_backoff_coefficient(1.0)
+            .set_maximum_attempts(0)
+            .set_circuit_breaker(circuit_breaker)
+            .run_resource_async(unreachable_async, success)
+        )
+
+    virtual_clock.advance(0.3)
+    asyncio.run(trial_cancelled())
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+    virtual_clock.advance(0.3)
+    log_inspect = asyncio.run(trial_raising())
+    assert log_inspect[0]["error"] == "ConnectionError('backend down')"
+    assert circuit_breaker.state == CircuitBreaker.OPEN
+    virtual_clock.advance(0.3)
+    with breaker_retry_policy as retry:
+        log_inspect = retry.run_resource(lambda: None, lambda result, policy: True)
+    assert log_inspect[0]["pass"] and circuit_breaker.state == CircuitBreaker.CLOSED
+
+    # A retry rejected by the open circuit gives its budget token back
+    budget_breaker = CircuitBreaker(failure_threshold=0.5, window=2, minimum_calls=2, clock=virtual_clock)
+    shared_budget = RetryBudget(capacity=3, refill_per_second=0.0, clock=virtual_clock)
+    with (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(10))
+        .set_backoff_coefficient(1.0)
+        .set_maximum_attempts(5)
+        .set_circuit_breaker(budget_breaker)
+        .set_retry_budget(shared_budget)
+        .set_clock(virtual_clock)
+    ) as retry:
+        log_inspect = retry.run_resource(lambda: None, failure)
+        attempts = retry.attempts
+    assert log_inspect[-1]["rejected"] == "circuit_open" and attempts == 2
+    assert shared_budget.tokens == 2
+
+    # The callers share a budget of 3 retries, once it is spent neither retries again
+    retry_budget = RetryBudget(capacity=3, refill_per_second=0.0)
+    budget_retry_policy = (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(10))
+        .set_backoff_coefficient(1.0)
+        .set_maximum_attempts(5)
+        .set_retry_budget(retry_budget)
+    )
+    with RetryExecutor(budget_retry_policy, max_workers=1) as executor:
+        logs = executor.run_resources([lambda: None, lambda: None], failure)
+    pprint.pprint(logs)
+    assert all(log[-1]["rejected"] == "retry_budget" for log in logs)
+    assert sum(log[-1]["attempt"] - 1 for log in logs) == 5
+
+    print("bounded logs and metrics")
+    retry_metrics = RetryMetrics()
+    metrics_retry_policy = (
+        RetryPolicy()
+        .set_initial_interval(Duration.of_milliseconds(10))
+        .set_backoff_coefficient(1.0)
+        .set_maximum_attempts(5)
+        .set_metrics(retry_metrics)
+    )
+    for _ in range(2):
+        with metrics_retry_policy as retry:
+            log_inspect = retry.run_resource(lambda: run_unbound_method(16), success)
+    assert [entry["attempt"] for entry in log_inspect.with_pass(False)] == [1, 2]
+    assert log_inspect.with_attempt(3)[0]["pass"]
+    assert log_inspect.column("attempt") == [1, 2, 3]
+    assert log_inspect.column("total_retry_time")[2] > 0.02
+    assert retry_metrics.attempts == 6 and retry_metrics.successes == 2
+    assert abs(retry_metrics.total_wait - 2 * (0.01 + 0.02)) < 1e-9
+    exported = retry_metrics.to_prometheus(labels={"resource": "stub"})
+    print(exported)
+    assert 'retry_attempts_total{resource="stub"} 6' in exported
+    assert 'retry_run_seconds_bucket{resource="stub",le="+Inf"} 6' in exported
+
+    # Only the newest items are kept, the totals still count them all
+    bounded_log = RetryLogs(capacity=3)
+    assert len(bounded_log._detail) == 0 and len(bounded_log._attempt) == 0
+    for attempt in range(1, 6):
+        bounded_log.append(
+            LogEntry({"attempt": attempt, "pass": attempt == 5, "total_retry_time": 0.1 * attempt})
+        )
+    assert len(bounded_log) == 3 and bounded_log[0]["attempt"] == 3
+    assert len(bounded_log._detail) == 3
+    assert bounded_log.column("attempt") == [3, 4, 5]
+    assert bounded_log.with_attempt(1) == [] and len(bounded_log.with_pass(False)) == 2
+    assert bounded_log.metrics.attempts == 5 and bounded_log.metrics.successes == 1
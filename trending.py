@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+DAY_SECONDS = 24 * 60 * 60
+# Seconds in each window, and from the epoch to the start of the first one, weeks starting on Monday
+WINDOWS = {"day": (DAY_SECONDS, 0), "week": (7 * DAY_SECONDS, 4 * DAY_SECONDS)}
+
+
+class TimeWindowedRatings:
+    """Rating counts and sums per movie in day or week windows, plus exponentially decayed counts
+    and means, all kept up to date as chunks of reviews are added. Queries over recent windows
+    only add up the window rows they cover rather than grouping the raw ratings"""
+
+    def __init__(self, window: str = "day", half_life_days: float = 7.0) -> None:
+        self.window = window
+        self._window_seconds, self._origin = WINDOWS[window]
+        self._decay_rate = np.log(2) / (half_life_days * DAY_SECONDS)
+        self.movie_ids = pd.Index([], dtype=np.int64)
+        self._pending: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._first_window = None
+        self._counts = sparse.csr_matrix((0, 0))
+        self._sums = sparse.csr_matrix((0, 0))
+        self._decayed_counts = np.zeros(0)
+        self._decayed_sums = np.zeros(0)
+        self.latest = None
+
+    def _windows(self, timestamps) -> np.ndarray:
+        return (np.asarray(timestamps, dtype=np.int64) - self._origin) // self._window_seconds
+
+    def _codes(self, movie_ids: pd.Series) -> np.ndarray:
+        new_ids = pd.Index(movie_ids.unique()).difference(self.movie_ids)
+        if len(new_ids):
+            self.movie_ids = self.movie_ids.append(new_ids)
+            grow = len(self.movie_ids) - len(self._decayed_counts)
+            self._decayed_counts = np.concatenate([self._decayed_counts, np.zeros(grow)])
+            self._decayed_sums = np.concatenate([self._decayed_sums, np.zeros(grow)])
+        return self.movie_ids.get_indexer(movie_ids)
+
+    def add(self, df_reviews: pd.DataFrame) -> "TimeWindowedRatings":
+        """Add a chunk of reviews with movieId, rating and timestamp in seconds, in any order"""
+        df_reviews = df_reviews.dropna(subset=["movieId", "rating", "timestamp"])
+        if df_reviews.empty:
+            return self
+        codes = self._codes(df_reviews["movieId"])
+        ratings = df_reviews["rating"].to_numpy(dtype=np.float64)
+        timestamps = df_reviews["timestamp"].to_numpy(dtype=np.int64)
+
+        # Only the chunk's totals per window and movie are kept
+        grouped = pd.DataFrame({"window": self._windows(timestamps), "movie": codes, "rating": ratings})
+        grouped = grouped.groupby(["window", "movie"])["rating"].agg(["count", "sum"]).reset_index()
+        self._pending.append(
+            (grouped["window"].to_numpy(), grouped["movie"].to_numpy(), grouped["count"].to_numpy(), grouped["sum"].to_numpy())
+        )
+
+        # Decay what is held to the newest time seen, then add the chunk decayed to the same time
+        latest = timestamps.max().item()
+        if self.latest is None or latest > self.latest:
+            if self.latest is not None:
+                decay = np.exp(-self._decay_rate * (latest - self.latest))
+                self._decayed_counts *= decay
+                self._decayed_sums *= decay
+            self.latest = latest
+        weights = np.exp(-self._decay_rate * (self.latest - timestamps))
+        self._decayed_counts += np.bincount(codes, weights=weights, minlength=len(self.movie_ids))
+        self._decayed_sums += np.bincount(codes, weights=weights * ratings, minlength=len(self.movie_ids))
+        return self
+
+    def _compact(self) -> None:
+        """Fold the totals of the chunks added since the last query into the window x movie matrices"""
+        if not self._pending:
+            if self._counts.shape[1] < len(self.movie_ids):
+                self._counts.resize((self._counts.shape[0], len(self.movie_ids)))
+                self._sums.resize((self._sums.shape[0], len(self.movie_ids)))
+            return
+        windows, movies, counts, sums = (np.concatenate(column) for column in zip(*self._pending))
+        self._pending = []
+        held = self._counts.tocoo()
+        held_sums = self._sums.tocoo()
+        first = windows.min().item() if self._first_window is None else min(self._first_window, windows.min().item())
+        shift = 0 if self._first_window is None else self._first_window - first
+        rows = np.concatenate([held.row + shift, windows - first])
+        columns = np.concatenate([held.col, movies])
+        shape = (rows.max().item() + 1, len(self.movie_ids))
+        self._counts = sparse.csr_matrix((np.concatenate([held.data, counts]), (rows, columns)), shape=shape)
+        self._sums = sparse.csr_matrix(
+            (np.concatenate([held_sums.data, sums]), (np.concatenate([held_sums.row + shift, windows - first]), columns)),
+            shape=shape,
+        )
+        self._first_window = first
+
+    def window_totals(self, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+        """Rating count and sum of each movie over the windows starting at timestamps start up to,
+        but not including, the window containing stop"""
+        self._compact()
+        if self._first_window is None:
+            return np.zeros(len(self.movie_ids)), np.zeros(len(self.movie_ids))
+        first, last = (self._windows([start, stop]) - self._first_window).tolist()
+        first, last = max(first, 0), max(min(last, self._counts.shape[0]), 0)
+        counts = np.asarray(self._counts[first:last].sum(axis=0)).ravel()
+        sums = np.asarray(self._sums[first:last].sum(axis=0)).ravel()
+        return counts, sums
+
+    def trending(self, days: int, n: int = 10, now: int = None, min_count: int = 1) -> pd.DataFrame:
+        """Movies rated most in the last days up to now (by default the newest rating), with their
+        mean rating then and the change in count from the days before. Whole windows are counted, so
+        with week windows days is rounded to weeks"""
+        now = self.latest if now is None else now
+        if now is None:
+            return pd.DataFrame(columns=["movieId", "count", "rating", "previous_count", "growth"])
+        stop = now + self._window_seconds
+        counts, sums = self.window_totals(stop - days * DAY_SECONDS, stop)
+        previous, _ = self.window_totals(stop - 2 * days * DAY_SECONDS, stop - days * DAY_SECONDS)
+        candidates = np.flatnonzero(counts >= max(min_count, 1))
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-counts[candidates], n - 1)[:n]]
+        candidates = candidates[np.lexsort((self.movie_ids.to_numpy()[candidates], -counts[candidates]))]
+        return pd.DataFrame(
+            {
+                "movieId": self.movie_ids.to_numpy()[candidates],
+                "count": counts[candidates].astype(np.int64),
+                "rating": sums[candidates] / counts[candidates],
+                "previous_count": previous[candidates].astype(np.int64),
+                "growth": (counts[candidates] - previous[candidates]).astype(np.int64),
+            }
+        )
+
+    def decayed(self, at: int = None) -> pd.DataFrame:
+        """Exponentially decayed rating count and mean rating of each movie as of at, by default
+        the newest rating, so recent ratings count for more than old ones"""
+        factor = 1.0 if at is None or self.latest is None else np.exp(-self._decay_rate * (at - self.latest))
+        counts = self._decayed_counts * factor
+        return pd.DataFrame(
+            {
+                "count": counts,
+                "rating": np.divide(self._decayed_sums, self._decayed_counts, out=np.full(len(counts), np.nan), where=self._decayed_counts > 0),
+            },
+            index=pd.Index(self.movie_ids, name="movieId"),
+        )
+
+
+if __name__ == "__main__":
+    import time
+
+    start_of_2010 = 1262304000
+    df_reviews = pd.DataFrame(
+        {
+            "userId": [1, 2, 3, 4, 5, 6],
+            "movieId": [72998, 72998, 1, 1, 1, 3],
+            "rating": [5.0, 4.0, 3.0, 3.0, 3.0, 2.0],
+            "timestamp": [start_of_2010 + offset * DAY_SECONDS for offset in [9, 8, 1, 2, 3, 9.5]],
+        }
+    )
+    windowed = TimeWindowedRatings("day", half_life_days=7)
+    # Ratings can arrive in any order and in chunks
+    windowed.add(df_reviews.iloc[3:]).add(df_reviews.iloc[:3])
+    trending = windowed.trending(days=3)
+    print(trending)
+    assert trending["movieId"].tolist() == [72998, 3]
+    assert trending["rating"].tolist() == [4.5, 2.0]
+    assert windowed.trending(days=10)["movieId"].tolist() == [1, 72998, 3]
+    assert windowed.trending(days=3, now=start_of_2010 + 3 * DAY_SECONDS)["count"].tolist() == [3]
+    assert windowed.trending(days=5)["growth"].tolist() == [2, 1]
+
+    decayed = windowed.decayed()
+    # A rating a half life old counts half as much as one now
+    assert np.isclose(decayed.loc[3, "count"], 1.0)
+    assert np.isclose(decayed.loc[1, "count"], sum(0.5 ** ((9.5 - day) / 7) for day in [1, 2, 3]))
+    assert np.isclose(decayed.loc[1, "rating"], 3.0)
+    assert np.isclose(windowed.decayed(at=windowed.latest + 7 * DAY_SECONDS).loc[3, "count"], 0.5)
+
+    weekly = TimeWindowedRatings("week").add(df_reviews)
+    # 2010-01-01 was a Friday, so days 1 to 3 fall in the first week starting Monday 2010-01-04
+    assert weekly.trending(days=7)["movieId"].tolist() == [72998, 1, 3]
+
+    # Trending queries over a large history only add up window rows
+    rng = np.random.default_rng(10)
+    size = 5_000_000
+    df_reviews = pd.DataFrame(
+        {
+            "movieId": rng.zipf(1.5, size) % 50_000,
+            "rating": rng.integers(1, 11, size) / 2,
+            "timestamp": rng.integers(964981247, 1262390400, size),
+        }
+    )
+    windowed = TimeWindowedRatings("day")
+    for chunk_start in range(0, size, 1_000_000):
+        windowed.add(df_reviews.iloc[chunk_start : chunk_start + 1_000_000])
+    windowed.trending(days=7)
+    start = time.perf_counter()
+    trending = windowed.trending(days=30, n=10)
+    print(f"Trending query took {(time.perf_counter() - start) * 1000:.2f} ms")
+    recent = df_reviews[df_reviews["timestamp"] >= (windowed.latest // DAY_SECONDS - 29) * DAY_SECONDS]
+    expected = recent["movieId"].value_counts()
+    assert trending["count"].tolist() == expected.head(10).tolist()
+    assert np.isclose(windowed.decayed()["count"].sum(), np.exp(-windowed._decay_rate * (windowed.latest - df_reviews["timestamp"])).sum())